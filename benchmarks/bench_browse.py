@@ -0,0 +1,85 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'intercept'))
+
+from browse import SESSION_COLUMN, TEXT_COLUMN, TIME_COLUMN, TYPE_COLUMN, capture_rows, load_details, query_rows
+from capture_log import LogFollower
+from sessions import SessionTable, session_names
+from synthetic import make_question
+
+# What the GUI's capture table does with a large capture log, without Qt:
+# reading it into rows, the memory those rows hold, reading type and text of
+# one screen of rows as it is scrolled to, and the background sorts and
+# filters.
+
+PAGE_ROWS = 30
+
+def write_captures(table, args):
+    rng = random.Random(args.seed)
+    for number in range(args.questions // args.per_capture):
+        timestamp = time.strftime("%d-%m-%Y_%H-%M-%S", time.gmtime(rng.randrange(10 ** 8)))
+        questions = []
+        for question_id in rng.sample(range(args.questions), args.per_capture):
+            question = make_question(random.Random(question_id), question_id)
+            question['timestamp'] = timestamp
+            questions.append(question)
+        table.append(f"s{number % args.sessions}", questions)
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Capture table reads, scrolling, sorting and filtering.')
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--per-capture', type=int, default=50)
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--pages', type=int, default=200, help='Screens of rows read while scrolling')
+    parser.add_argument('--filter', default='синдром')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        table = SessionTable(directory)
+        write_captures(table, args)
+        table.close()
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        rows = []
+        for name in session_names(directory):
+            rows.extend(capture_rows(name, LogFollower(table.get(name).capture_log.path)))
+        read_time = time.perf_counter() - started
+        row_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        rng = random.Random(args.seed)
+        page_times = []
+        for _ in range(args.pages):
+            first = rng.randrange(max(len(rows) - PAGE_ROWS, 1))
+            page_times.append(timed(load_details, rows[first:first + PAGE_ROWS])[0])
+
+        queries = [('time, descending', TIME_COLUMN, True, ''), ('session', SESSION_COLUMN, False, ''),
+                   ('type', TYPE_COLUMN, False, ''), ('text', TEXT_COLUMN, False, ''),
+                   (f'filter "{args.filter}"', TIME_COLUMN, False, args.filter)]
+        results = [(label, *timed(query_rows, rows, column, descending, text))
+                   for label, column, descending, text in queries]
+
+    print(f"{len(rows)} captured questions read into rows in {read_time:.2f} s, "
+          f"{row_memory / 2 ** 20:.1f} MB ({row_memory / max(len(rows), 1):.0f} B per row)")
+    page_times.sort()
+    print(f"screen of {PAGE_ROWS} rows: p50 {statistics.median(page_times) * 1000:.2f} ms, "
+          f"p99 {page_times[int(len(page_times) * 0.99)] * 1000:.2f} ms")
+    for label, elapsed, order in results:
+        print(f"sort/filter by {label}: {elapsed * 1000:.0f} ms, {len(order)} rows")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'intercept'))
+
+from corpus import Corpus, write_corpus
+from render import write_rendered
+from synthetic import make_questions
+
+TYPE_NAMES = {1: 'SINGLE', 2: 'MULTIPLE', 3: 'MATCHING'}
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+def load_json(path):
+    with open(path, 'r', encoding='utf-8-sig') as file:
+        return json.load(file)
+
+def load_corpus(path):
+    with Corpus(path) as corpus:
+        return list(corpus)
+
+def lookup_json(path, ids):
+    # Without an index the whole export has to be parsed first.
+    questions = {str(question['id']): question for question in load_json(path)}
+    return [questions[identifier] for identifier in ids]
+
+def lookup_corpus(path, ids):
+    with Corpus(path) as corpus:
+        return [corpus.get(identifier) for identifier in ids]
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the JSON export with the binary corpus.')
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=1000)
+    args = parser.parse_args()
+
+    # Real exports repeat answer texts a lot, draw them from a small pool.
+    questions = make_questions(args.questions)
+    rng = random.Random(1)
+    answers = [answer['answer'] for question in questions[:2000] for answer in question['answers']]
+    for question in questions:
+        question['type'] = TYPE_NAMES[question['type']]
+        for answer in question['answers']:
+            answer['answer'] = rng.choice(answers)
+
+    ids = [str(question['id']) for question in random.Random(2).sample(questions, min(args.lookups, len(questions)))]
+
+    print(f"{'format':>8} {'save s':>8} {'load s':>8} {'lookup s':>9} {'size MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, save, load, lookup in (
+            ('json', write_rendered, load_json, lookup_json),
+            ('ksq', write_corpus, load_corpus, lookup_corpus),
+        ):
+            path = os.path.join(directory, f"export.{name}")
+            save_time, _ = timed(save, path, questions)
+            load_time, loaded = timed(load, path)
+            lookup_time, found = timed(lookup, path, ids)
+            if loaded != questions or [str(question['id']) for question in found] != ids:
+                raise SystemExit(f"{name} did not round-trip")
+            print(f"{name:>8} {save_time:>8.2f} {load_time:>8.2f} {lookup_time:>9.3f} "
+                  f"{os.path.getsize(path) / 2 ** 20:>8.1f}")
+
+if __name__ == "__main__":
+    main()
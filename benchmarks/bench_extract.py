@@ -0,0 +1,49 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'intercept'))
+
+from extract import scan_questions_tag, soup_questions_tag
+from synthetic import make_page, make_questions
+
+def best_of(repeat, func, *args):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare <questions> extraction paths.')
+    parser.add_argument('--questions', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--filler-kb', type=int, default=512)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        import bs4  # noqa: F401
+        have_soup = True
+    except ImportError:
+        have_soup = False
+        print("beautifulsoup4 is not installed, timing the fast path only.")
+
+    print(f"{'questions':>10} {'page KB':>10} {'scan ms':>10} {'soup ms':>10} {'speedup':>8}")
+    for count in args.questions:
+        page = make_page(make_questions(count), args.filler_kb)
+        scan_time, scanned = best_of(args.repeat, scan_questions_tag, page)
+        assert scanned is not None, "fast path failed on synthetic page"
+
+        if have_soup:
+            soup_time, souped = best_of(args.repeat, soup_questions_tag, page.decode('utf-8'))
+            assert souped == scanned, "fast path and BeautifulSoup disagree"
+            print(f"{count:>10} {len(page) // 1024:>10} {scan_time * 1000:>10.2f} "
+                  f"{soup_time * 1000:>10.2f} {soup_time / scan_time:>7.1f}x")
+        else:
+            print(f"{count:>10} {len(page) // 1024:>10} {scan_time * 1000:>10.2f} {'-':>10} {'-':>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'intercept'))
+
+from identity import NearDuplicateIndex, question_digest
+from synthetic import make_questions
+
+def with_near_duplicates(questions, rate, seed=0):
+    rng = random.Random(seed)
+    result = list(questions)
+    for question in rng.sample(questions, int(len(questions) * rate)):
+        copied = copy.deepcopy(question)
+        copied['text'] = '  ' + copied['text'].upper() + ' ?'
+        rng.shuffle(copied['answers'])
+        result.append(copied)
+    return result
+
+def cluster(size, seed=0):
+    # Variants of one question that differ in a word or two: they share most
+    # LSH buckets, the worst case for grouping.
+    rng = random.Random(seed)
+    base = make_questions(1, seed)[0]
+    words = (base['text'] + ' ' + ' '.join(answer['answer'] for answer in base['answers'])).split()
+    words = (words * 4)[:60]
+    questions = []
+    for number in range(size):
+        variant = list(words)
+        variant[rng.randrange(len(variant))] = f"слово{number}"
+        questions.append({**base, 'text': ' '.join(variant)})
+    return questions
+
+def time_cluster(size):
+    index = NearDuplicateIndex()
+    for key, question in enumerate(cluster(size)):
+        index.add(key, question)
+    started = time.perf_counter()
+    groups = index.groups()
+    return time.perf_counter() - started, groups
+
+def main():
+    parser = argparse.ArgumentParser(description='Time content digests and near-duplicate grouping.')
+    parser.add_argument('--questions', type=int, nargs='+', default=[10000, 25000, 50000, 100000])
+    parser.add_argument('--duplicate-rate', type=float, default=0.05)
+    parser.add_argument('--cluster', type=int, nargs='+', default=[1000, 4000, 16000],
+                        help='Sizes of a single cluster of similar questions')
+    args = parser.parse_args()
+
+    print(f"{'questions':>10} {'digest s':>10} {'index s':>10} {'groups s':>10} {'groups':>8} {'us/question':>12}")
+    for count in args.questions:
+        questions = with_near_duplicates(make_questions(count), args.duplicate_rate)
+
+        started = time.perf_counter()
+        for question in questions:
+            question_digest(question)
+        digest_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = NearDuplicateIndex()
+        for key, question in enumerate(questions):
+            index.add(key, question)
+        index_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        groups = index.groups()
+        groups_time = time.perf_counter() - started
+
+        total = digest_time + index_time + groups_time
+        print(f"{len(questions):>10} {digest_time:>10.2f} {index_time:>10.2f} {groups_time:>10.2f} "
+              f"{len(groups):>8} {total / len(questions) * 1e6:>12.1f}")
+
+    print()
+    print(f"{'cluster':>10} {'groups s':>10} {'groups':>8} {'largest':>8}")
+    for size in args.cluster:
+        groups_time, groups = time_cluster(size)
+        print(f"{size:>10} {groups_time:>10.2f} {len(groups):>8} {max(map(len, groups), default=0):>8}")
+
+if __name__ == "__main__":
+    main()
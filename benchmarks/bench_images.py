@@ -0,0 +1,78 @@
+import argparse
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'intercept'))
+
+from images import ImageStore, fetch_images
+
+class ImageHandler(http.server.BaseHTTPRequestHandler):
+    # Stand-in for ks.rsmu.ru/upload: every URL is an image, and only
+    # `distinct` different pictures exist, as with images reused across
+    # questions.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.02
+    distinct = 50
+
+    def do_GET(self):
+        self.server.requests += 1
+        self.server.connections.add(self.client_address)
+        number = int(os.path.splitext(os.path.basename(self.path))[0])
+        body = (f"image {number % self.distinct} ".encode()) * 512
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+    server.daemon_threads = True
+    server.requests = 0
+    server.connections = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Image archival against a local stand-in server.')
+    parser.add_argument('--images', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=0.02, help='Server latency per image, seconds')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+    ImageHandler.latency = args.latency
+
+    print(f"{'jobs':>6} {'seconds':>10} {'images/s':>10} {'requests':>10} {'connections':>12} {'files':>8}")
+    for jobs in args.jobs:
+        server = serve()
+        base_url = f"http://127.0.0.1:{server.server_port}/upload/l_btz_fileanswer/"
+        urls = [f"{base_url}{i}.png" for i in range(args.images)]
+        with tempfile.TemporaryDirectory() as directory:
+            store = ImageStore(directory)
+            started = time.perf_counter()
+            downloaded, failed = fetch_images(urls, store, jobs)
+            elapsed = time.perf_counter() - started
+            assert not failed, failed
+
+            # A second pass must not touch the network.
+            requests = server.requests
+            fetch_images(urls, store, jobs)
+            assert server.requests == requests
+
+            files = len(store.files())
+            store.close()
+        server.shutdown()
+        server.server_close()
+        print(f"{jobs:>6} {elapsed:>10.2f} {len(downloaded) / elapsed:>10.1f} {requests:>10} "
+              f"{len(server.connections):>12} {files:>8}")
+
+if __name__ == "__main__":
+    main()
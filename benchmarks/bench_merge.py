@@ -0,0 +1,94 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+try:
+    import resource
+except ImportError:
+    # Not on Windows, which gets no RSS figures.
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'intercept'))
+
+from export import load_questions
+from merge import merge_exports
+from question_bank import TIMESTAMP_FORMAT
+from render import write_rendered
+from synthetic import make_question
+
+TYPE_NAMES = {1: 'SINGLE', 2: 'MULTIPLE', 3: 'MATCHING'}
+
+def snapshot(question_ids, taken):
+    # One `save` worth of questions; a question is the same in every snapshot.
+    timestamp = taken.strftime(TIMESTAMP_FORMAT)
+    for question_id in question_ids:
+        question = make_question(random.Random(question_id), question_id)
+        question['type'] = TYPE_NAMES[question['type']]
+        question['timestamp'] = timestamp
+        yield question
+
+def run_merge(paths, destination, memory_limit):
+    def progress(state, done_bytes):
+        print(f"\r  {done_bytes / 2 ** 20:.0f}/{state.total_bytes / 2 ** 20:.0f} MB, "
+              f"{state.read} questions, {state.unique} unique", end='', flush=True)
+
+    merge_exports(paths, destination, memory_limit=memory_limit, progress=progress)
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge overlapping exports in bounded memory.')
+    parser.add_argument('--files', type=int, default=40)
+    parser.add_argument('--questions', type=int, default=50000, help='Questions per file')
+    parser.add_argument('--pool', type=int, default=400000, help='Distinct questions to draw from')
+    parser.add_argument('--memory-limit', type=int, default=64, help='MB')
+    parser.add_argument('--output-format', default='json')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    first_seen = {}
+    started = datetime(2024, 1, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for number in range(args.files):
+            question_ids = rng.sample(range(args.pool), args.questions)
+            taken = started + timedelta(days=number)
+            for question_id in question_ids:
+                first_seen.setdefault(question_id, taken.strftime(TIMESTAMP_FORMAT))
+            path = os.path.join(directory, f"{number:04}.json")
+            write_rendered(path, snapshot(question_ids, taken))
+            paths.append(path)
+        input_size = sum(os.path.getsize(path) for path in paths)
+        print(f"Generated {args.files} files, {input_size / 2 ** 30:.2f} GB, "
+              f"{args.files * args.questions} questions, {len(first_seen)} unique")
+
+        destination = os.path.join(directory, 'merged', f"merged.{args.output_format}")
+        elapsed = time.perf_counter()
+        # A fresh interpreter, so the peak RSS is the merge's alone.
+        process = multiprocessing.get_context('spawn').Process(
+            target=run_merge, args=(paths, destination, args.memory_limit * 2 ** 20))
+        process.start()
+        process.join()
+        elapsed = time.perf_counter() - elapsed
+        if process.exitcode:
+            raise SystemExit(f"merge failed with exit code {process.exitcode}")
+        # ru_maxrss is in kilobytes on Linux.
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 2 ** 10 if resource else None
+
+        merged = 0
+        for question in load_questions(destination):
+            if question['timestamp'] != first_seen[question['id']]:
+                raise SystemExit(f"question {question['id']} lost its earliest timestamp")
+            merged += 1
+        if merged != len(first_seen):
+            raise SystemExit(f"merged {merged} questions, expected {len(first_seen)}")
+
+        rss = f"peak RSS {peak:.0f} MB" if peak is not None else "peak RSS unknown"
+        print(f"Merged in {elapsed:.1f} s ({input_size / 2 ** 20 / elapsed:.0f} MB/s), "
+              f"{rss} with a {args.memory_limit} MB limit")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'intercept'))
+
+from render import RENDERERS, render_questions_to_text, write_rendered
+from synthetic import make_questions
+
+TYPE_NAMES = {1: 'SINGLE', 2: 'MULTIPLE', 3: 'MATCHING'}
+
+def measure(func, *args):
+    # tracemalloc slows allocation-heavy code down a lot, so time and memory
+    # are taken from separate runs.
+    started = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def write_joined_text(path, questions, output_format):
+    with open(path, 'w', encoding='utf-8-sig') as file:
+        file.write(render_questions_to_text(questions))
+
+def write_joined_json(path, questions, output_format):
+    with open(path, 'w', encoding='utf-8-sig') as file:
+        json.dump(questions, file, ensure_ascii=False, indent=4)
+
+BASELINES = {
+    'txt': write_joined_text,
+    'json': write_joined_json,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare joined and streamed export rendering.')
+    parser.add_argument('--questions', type=int, default=100000)
+    args = parser.parse_args()
+
+    questions = make_questions(args.questions)
+    for question in questions:
+        question['type'] = TYPE_NAMES[question['type']]
+
+    print(f"{'renderer':>14} {'seconds':>10} {'peak MB':>10} {'output MB':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for output_format in RENDERERS:
+            runs = [('stream', write_rendered)]
+            if output_format in BASELINES:
+                runs.insert(0, ('joined', BASELINES[output_format]))
+            for label, writer in runs:
+                path = os.path.join(directory, f"{label}.{output_format}")
+                elapsed, peak = measure(writer, path, questions, output_format)
+                print(f"{f'{output_format} ({label})':>14} {elapsed:>10.2f} {peak / 2 ** 20:>10.1f} "
+                      f"{os.path.getsize(path) / 2 ** 20:>10.1f}")
+
+if __name__ == "__main__":
+    main()
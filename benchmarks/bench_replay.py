@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:
+    # Not on Windows, which gets no RSS figures.
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'intercept'))
+
+import intercept
+from capture_log import QUARANTINE_FILE, iter_records
+from export import deduplicate_questions
+from metrics import Counter, StageTimer
+from question_bank import BANK_FILE
+from render import render_questions_to_text
+from routes import DEFAULT_CAPTURE_ROUTES, QUESTIONS_ROUTE, RouteTable
+from sessions import SESSION_HEADER
+from synthetic import make_page, make_question
+
+# Replays question pages through the addon's response() hook without a proxy
+# or a live exam site, then runs the save path over what was captured. Exits
+# with status 1 when a threshold is missed, so it can guard against
+# regressions.
+
+def synthetic_pages(args):
+    rng = random.Random(args.seed)
+    pool = args.pool or args.pages * args.questions
+    for _ in range(args.pages):
+        question_ids = rng.sample(range(pool), args.questions)
+        questions = [
+            make_question(random.Random(question_id), question_id, args.matching_rate, args.image_rate)
+            for question_id in question_ids
+        ]
+        yield make_page(questions, args.filler_kb)
+
+def make_flows(pages, route, gzip, sessions):
+    from mitmproxy.test import tflow, tutils
+
+    host, _, path = route.partition('/')
+    flows = []
+    for number, page in enumerate(pages):
+        flow = tflow.tflow(
+            req=tutils.treq(host=host, port=443, scheme=b'https', path=b'/' + path.encode()),
+            resp=tutils.tresp(content=page),
+        )
+        if sessions > 1:
+            flow.request.headers[SESSION_HEADER] = f"client{number % sessions}"
+        flow.response.headers['content-type'] = 'text/html; charset=utf-8'
+        if gzip:
+            flow.response.encode('gzip')
+        flows.append(flow)
+    return flows
+
+def recorded_flows(paths):
+    # Responses from `mitmdump -w FILE` dumps; the route table decides which
+    # of them are question pages.
+    from mitmproxy import http, io as flow_io
+
+    flows = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            for flow in flow_io.FlowReader(file).stream():
+                if isinstance(flow, http.HTTPFlow) and flow.response is not None:
+                    flows.append(flow)
+    return flows
+
+def fixture_pages(paths):
+    for path in paths:
+        with open(path, 'rb') as file:
+            yield file.read()
+
+def reset_addon(directory, route, sessions):
+    intercept.capture_worker.close()
+    intercept.sessions.reset(directory)
+    intercept.session_mode = 'header' if sessions > 1 else 'none'
+    intercept.question_bank.close()
+    intercept.question_bank.path = os.path.join(directory, BANK_FILE)
+    intercept.quarantine_log.close()
+    intercept.quarantine_log.path = os.path.join(directory, QUARANTINE_FILE)
+    intercept.route_table = RouteTable().add(route, QUESTIONS_ROUTE)
+    # Fresh metrics, so that every run reports only its own captures.
+    intercept.counters = {name: Counter(counter.name, counter.help) for name, counter in intercept.counters.items()}
+    timer = intercept.stage_timer
+    intercept.stage_timer = StageTimer(timer.name, timer.help, tuple(timer.stages))
+
+def close_addon():
+    intercept.capture_worker.close()
+    intercept.sessions.close()
+    intercept.question_bank.close()
+    intercept.quarantine_log.close()
+
+async def replay(flows, wait_each):
+    # With wait_each every capture is finished before the next one starts,
+    # which gives its end-to-end latency; otherwise the flows are pipelined
+    # the way a browser would send them.
+    latencies = []
+    for flow in flows:
+        started = time.perf_counter()
+        await intercept.response(flow)
+        if wait_each:
+            intercept.capture_worker.join()
+            latencies.append(time.perf_counter() - started)
+    intercept.capture_worker.join()
+    return latencies
+
+def run(flows, route, directory, sessions):
+    reset_addon(directory, route, sessions)
+    timings = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        latencies = asyncio.run(replay(flows, wait_each=True))
+        timings['latency'] = time.perf_counter() - started
+        # Per-stage times of the captures timed one by one.
+        stages = intercept.stage_timer.summary()
+
+        os.makedirs(os.path.join(directory, 'pipelined'))
+        reset_addon(os.path.join(directory, 'pipelined'), route, sessions)
+        started = time.perf_counter()
+        asyncio.run(replay(flows, wait_each=False))
+        timings['pipelined'] = time.perf_counter() - started
+        intercept.sessions.sync()
+
+        # Sessions are saved one by one; the export figures are for all of them.
+        started = time.perf_counter()
+        questions = []
+        for session in intercept.sessions.all():
+            questions.extend(deduplicate_questions(iter_records(session.capture_log.path)))
+        timings['dedup'] = time.perf_counter() - started
+        started = time.perf_counter()
+        text = render_questions_to_text(questions)
+        timings['render'] = time.perf_counter() - started
+    close_addon()
+    return latencies, stages, questions, len(text), timings
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay question pages through the addon and check thresholds.')
+    source = parser.add_argument_group('input, synthetic pages unless --flows or --html is given')
+    source.add_argument('--flows', nargs='+', default=[], help='mitmproxy .flow dumps')
+    source.add_argument('--html', nargs='+', default=[], help='Saved question pages')
+    source.add_argument('--pages', type=int, default=200)
+    source.add_argument('--questions', type=int, default=50, help='Questions per page')
+    source.add_argument('--pool', type=int, default=0, help='Distinct questions to draw from, for duplicates')
+    source.add_argument('--matching-rate', type=float, default=0.2)
+    source.add_argument('--image-rate', type=float, default=0.1)
+    source.add_argument('--filler-kb', type=int, default=256, help='Markup around the <questions> tag')
+    source.add_argument('--gzip', action='store_true', help='Serve synthetic pages gzip-encoded')
+    source.add_argument('--seed', type=int, default=0)
+    source.add_argument('--route', default=DEFAULT_CAPTURE_ROUTES[0])
+    source.add_argument('--sessions', type=int, default=1, help='Spread synthetic pages over this many sessions')
+    limits = parser.add_argument_group('thresholds, missing one exits with status 1')
+    limits.add_argument('--max-p99-ms', type=float, default=250.0, help='Capture latency')
+    limits.add_argument('--min-captures-per-second', type=float, default=20.0, help='Pipelined replay')
+    limits.add_argument('--min-export-questions-per-second', type=float, default=2000.0,
+                        help='deduplicate_questions plus render_questions_to_text')
+    limits.add_argument('--max-peak-mb', type=float, default=512.0, help='Traced peak during the replay')
+    args = parser.parse_args()
+
+    if args.flows:
+        flows = recorded_flows(args.flows)
+    else:
+        pages = fixture_pages(args.html) if args.html else synthetic_pages(args)
+        flows = make_flows(pages, args.route, args.gzip, args.sessions)
+    if not flows:
+        raise SystemExit("Nothing to replay.")
+    page_bytes = sum(len(flow.response.raw_content or b'') for flow in flows)
+
+    with tempfile.TemporaryDirectory() as directory:
+        latencies, stages, questions, text_size, timings = run(flows, args.route, directory, args.sessions)
+
+    # tracemalloc slows allocation-heavy code down a lot, so memory comes from
+    # a separate run.
+    with tempfile.TemporaryDirectory() as directory:
+        tracemalloc.start()
+        run(flows, args.route, directory, args.sessions)
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    captures_per_second = len(flows) / timings['pipelined']
+    export_time = timings['dedup'] + timings['render']
+    export_rate = len(questions) / export_time if export_time else float('inf')
+    p50 = percentile(latencies, 0.5) * 1000
+    p99 = percentile(latencies, 0.99) * 1000
+
+    print(f"Replayed {len(flows)} responses, {page_bytes / 2 ** 20:.1f} MB on the wire, "
+          f"{len(questions)} unique questions, {text_size / 2 ** 20:.1f} MB of text")
+    print(f"capture latency    p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    print(f"stages             {stages}")
+    print(f"pipelined          {captures_per_second:.1f} captures/s, "
+          f"{page_bytes / 2 ** 20 / timings['pipelined']:.1f} MB/s")
+    print(f"export             dedup {timings['dedup']:.2f} s, render {timings['render']:.2f} s, "
+          f"{export_rate:.0f} questions/s")
+    rss = f", {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10:.0f} MB RSS" if resource else ''
+    print(f"peak memory        {peak:.1f} MB traced{rss}")
+
+    failures = []
+    if p99 > args.max_p99_ms:
+        failures.append(f"p99 capture latency {p99:.2f} ms > {args.max_p99_ms} ms")
+    if captures_per_second < args.min_captures_per_second:
+        failures.append(f"{captures_per_second:.1f} captures/s < {args.min_captures_per_second}")
+    if export_rate < args.min_export_questions_per_second:
+        failures.append(f"export {export_rate:.0f} questions/s < {args.min_export_questions_per_second}")
+    if peak > args.max_peak_mb:
+        failures.append(f"peak memory {peak:.1f} MB > {args.max_peak_mb} MB")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        raise SystemExit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
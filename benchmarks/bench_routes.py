@@ -0,0 +1,92 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'intercept'))
+
+from routes import DEFAULT_CAPTURE_ROUTES, QUESTIONS_ROUTE, RouteTable
+
+HOSTS = ('www.google.com', 'yandex.ru', 'cdn.jsdelivr.net', 'vk.com', 'ks2.rsmu.ru', 'fonts.gstatic.com')
+PATHS = ('/', '/search?q=test', '/static/app.js', '/tests2/results', '/images/logo.png')
+
+def make_requests(count, seed=0):
+    # Non-matching traffic only: the common case the addon has to skip.
+    rng = random.Random(seed)
+    return [('https', rng.choice(HOSTS), 443, rng.choice(PATHS)) for _ in range(count)]
+
+def pretty_url_check(requests):
+    # What the addon used to do: build the full URL for every flow.
+    matched = 0
+    for scheme, host, port, path in requests:
+        authority = host if port in (80, 443) else f"{host}:{port}"
+        if f"{scheme}://{authority}{path}" == "https://ks2.rsmu.ru/tests2/questions":
+            matched += 1
+    return matched
+
+def route_table_check(requests, table):
+    matched = 0
+    for scheme, host, port, path in requests:
+        if table.match(host, path) is not None:
+            matched += 1
+    return matched
+
+def make_flows(requests):
+    from mitmproxy.test import tflow
+
+    flows = []
+    for scheme, host, port, path in requests:
+        flow = tflow.tflow(resp=True)
+        flow.request.scheme, flow.request.host, flow.request.port, flow.request.path = scheme, host, port, path
+        flows.append(flow)
+    return flows
+
+def flow_pretty_url_check(flows):
+    return sum(1 for flow in flows if flow.request.pretty_url == "https://ks2.rsmu.ru/tests2/questions")
+
+def flow_route_table_check(flows, table):
+    return sum(1 for flow in flows if table.match(flow.request.host, flow.request.path) is not None)
+
+def best_of(repeat, func, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-flow overhead of route matching for non-target traffic.')
+    parser.add_argument('--flows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    requests = make_requests(args.flows)
+    table = RouteTable()
+    for route in DEFAULT_CAPTURE_ROUTES:
+        table.add(route, QUESTIONS_ROUTE)
+
+    assert pretty_url_check(requests) == route_table_check(requests, table) == 0
+
+    old = best_of(args.repeat, pretty_url_check, requests)
+    new = best_of(args.repeat, route_table_check, requests, table)
+    print(f"{'check':>12} {'ns/flow':>10}")
+    print(f"{'pretty_url':>12} {old / args.flows * 1e9:>10.1f}")
+    print(f"{'route table':>12} {new / args.flows * 1e9:>10.1f}")
+
+    try:
+        flows = make_flows(requests[:20000])
+    except ImportError:
+        print("mitmproxy is not installed, skipping the HTTPFlow measurement.")
+    else:
+        old = best_of(args.repeat, flow_pretty_url_check, flows)
+        new = best_of(args.repeat, flow_route_table_check, flows, table)
+        print(f"{'HTTPFlow pretty_url':>12} {old / len(flows) * 1e9:>10.1f}")
+        print(f"{'HTTPFlow route table':>12} {new / len(flows) * 1e9:>10.1f}")
+
+    print("Hosts outside the route table are not TLS-intercepted at all (allow_hosts), "
+          "so in the proxy they never reach the addon.")
+
+if __name__ == "__main__":
+    main()
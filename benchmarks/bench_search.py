@@ -0,0 +1,76 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'intercept'))
+
+from question_bank import BANK_FILE, QuestionBank
+from search import WORD_RE
+from synthetic import WORDS, make_questions
+
+TYPE_NAMES = {1: 'SINGLE', 2: 'MULTIPLE', 3: 'MATCHING'}
+SYLLABLES = ('ка', 'ро', 'ми', 'ту', 'не', 'за', 'ле', 'ви', 'да', 'со', 'пе', 'гри', 'сто', 'мал')
+ENDINGS = ('', 'а', 'ы', 'ом', 'ами', 'ой', 'ого', 'ии')
+
+def make_vocabulary(rng, size):
+    return [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(size)]
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def timed_queries(question_bank, queries, limit):
+    latencies = []
+    found = 0
+    for query in queries:
+        started = time.perf_counter()
+        found += bool(list(question_bank.search(query, limit=limit)))
+        latencies.append(time.perf_counter() - started)
+    return latencies, found
+
+def main():
+    parser = argparse.ArgumentParser(description='Index synthetic questions and time full-text searches.')
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--vocabulary', type=int, default=20000, help='Rare words mixed into the texts')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    # The synthetic texts only use a dozen medical words, which every question
+    # contains; inflected rare words make the selective queries realistic.
+    rng = random.Random(1)
+    vocabulary = make_vocabulary(rng, args.vocabulary)
+    questions = make_questions(args.questions)
+    for question in questions:
+        question['type'] = TYPE_NAMES[question['type']]
+        words = question['text'].split()
+        for _ in range(max(1, len(words) // 4)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(vocabulary) + rng.choice(ENDINGS))
+        question['text'] = ' '.join(words)
+
+    selective = []
+    for question in rng.sample(questions, args.queries):
+        words = [word for word in WORD_RE.findall(question['text']) if word.lower() not in WORDS]
+        selective.append(' '.join(rng.sample(words, min(2, len(words)))))
+    common = [' '.join(rng.sample(WORDS, 2)) for _ in range(args.queries // 10 or 1)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        with QuestionBank(os.path.join(directory, BANK_FILE)) as question_bank:
+            started = time.perf_counter()
+            question_bank.add(questions)
+            index_time = time.perf_counter() - started
+            print(f"Indexed {args.questions} questions in {index_time:.1f} s, "
+                  f"{args.questions / index_time:.0f} questions/s, "
+                  f"{os.path.getsize(question_bank.path) / 2 ** 20:.0f} MB bank")
+
+            for name, queries in (('selective', selective), ('common words', common)):
+                latencies, found = timed_queries(question_bank, queries, args.limit)
+                print(f"{name:>13}: {len(queries)} queries, {found} with results, "
+                      f"p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+                      f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
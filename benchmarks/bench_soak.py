@@ -0,0 +1,98 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'intercept'))
+
+from capture_log import CaptureLog, encode_record, log_size, read_records, segment_paths
+from sessions import DEFAULT_SESSION, SessionTable, save_sessions
+from synthetic import make_question
+
+# Appends captures for a long simulated run through the addon's session
+# table, then saves them, and reports traced memory along the way: it should
+# stay flat while capturing and under the save memory limit while saving,
+# however long the run.
+
+def captures(args):
+    rng = random.Random(args.seed)
+    for number in range(args.captures):
+        timestamp = time.strftime("%d-%m-%Y_%H-%M-%S", time.gmtime(number * 60))
+        questions = []
+        for question_id in rng.sample(range(args.pool), args.questions):
+            question = make_question(random.Random(question_id), question_id)
+            question['type'] = 'MATCHING' if 'answers_draggable' in question else 'SINGLE'
+            question['timestamp'] = timestamp
+            questions.append(question)
+        yield questions
+
+def check_recovery(directory):
+    # A crash mid-append leaves the last record without its newline. Reopening
+    # the log must keep that record when it is whole, drop it when it is cut
+    # short, and never glue the next append onto it, also for records longer
+    # than the block recover_tail scans back in.
+    for size in (100, 6000, 20000):
+        record = {'text': 'x' * size, 'answers': []}
+        line = encode_record(record)
+        for tail, kept in ((line[:-1], True), (line[:len(line) // 2], False)):
+            path = os.path.join(directory, 'recovery.jsonl')
+            with open(path, 'wb') as file:
+                file.write(encode_record({'text': 'first'}) + tail)
+            log = CaptureLog(path)
+            log.append([{'text': 'next'}])
+            log.close()
+            records = read_records(path)[0]
+            expected = [{'text': 'first'}] + ([record] if kept else []) + [{'text': 'next'}]
+            if records != expected:
+                raise SystemExit(f"FAIL: recovering a {len(tail)} byte {'whole' if kept else 'cut'} "
+                                 f"last record left {len(records)} records")
+            os.remove(path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that capture and save memory stays flat over a long run.')
+    parser.add_argument('--captures', type=int, default=2000)
+    parser.add_argument('--questions', type=int, default=50, help='Questions per capture')
+    parser.add_argument('--pool', type=int, default=100000, help='Distinct questions to draw from')
+    parser.add_argument('--segment-mb', type=float, default=16)
+    parser.add_argument('--save-memory-mb', type=float, default=64)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        check_recovery(directory)
+        table = SessionTable(directory, segment_bytes=int(args.segment_mb * 2 ** 20))
+        tracemalloc.start()
+        checkpoints = []
+        started = time.perf_counter()
+        for number, questions in enumerate(captures(args), start=1):
+            table.append(DEFAULT_SESSION, questions)
+            if number % (args.captures // 8 or 1) == 0:
+                checkpoints.append((number, tracemalloc.get_traced_memory()[0] / 2 ** 20))
+        capture_time = time.perf_counter() - started
+        capture_peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+
+        log_path = table.get().capture_log.path
+        size = log_size(log_path)
+        segments = len(segment_paths(log_path))
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        paths = save_sessions(table, ['json'], os.path.join(directory, 'output'),
+                              memory_limit=int(args.save_memory_mb * 2 ** 20))
+        save_time = time.perf_counter() - started
+        save_peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+        table.close()
+        export_size = sum(os.path.getsize(path) for path in paths)
+
+    print(f"Captured {args.captures} pages, {size / 2 ** 20:.0f} MB of log in {segments} files, "
+          f"{capture_time:.1f} s")
+    print("traced memory while capturing: " + ', '.join(f"{number}: {mb:.1f} MB" for number, mb in checkpoints)
+          + f", peak {capture_peak:.1f} MB")
+    print(f"save: {save_time:.1f} s, {export_size / 2 ** 20:.0f} MB exported, traced peak {save_peak:.1f} MB "
+          f"(limit {args.save_memory_mb:g} MB)")
+
+if __name__ == "__main__":
+    main()
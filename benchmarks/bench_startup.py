@@ -0,0 +1,77 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'intercept', 'cli.py')
+# Nothing on the stop/status path should load these.
+HEAVY_MODULES = ('mitmproxy', 'bs4', 'PySide6', 'watchdog', 'sqlite3', 'asyncio', 'http.client',
+                 'concurrent.futures')
+
+def run_cli(args, cwd, importtime=False):
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), CLI, *args]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=cwd, capture_output=True, text=True)
+    return time.perf_counter() - started, result
+
+def time_python(cwd):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], cwd=cwd)
+    return time.perf_counter() - started
+
+def parse_importtime(stderr):
+    # "import time: self [us] | cumulative | imported package", nested imports
+    # are indented under the package that pulled them in.
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(cumulative), len(name) - len(name.lstrip())))
+    return imports
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time of common cli.py commands.')
+    parser.add_argument('commands', nargs='*', default=['status', 'stop'])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=100.0, help='Median wall time per command')
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        _, result = run_cli(['status'], directory)
+        if 'not running' not in result.stdout:
+            raise SystemExit("A proxy is running; stop it first, `stop` would shut it down.")
+
+        baseline = min(time_python(directory) for _ in range(args.repeat))
+        print(f"{'command':>10} {'median ms':>10} {'min ms':>8} {'imports ms':>11}  slowest imports")
+        for command in args.commands:
+            times = [run_cli([command], directory)[0] for _ in range(args.repeat)]
+            _, result = run_cli([command], directory, importtime=True)
+            imports = parse_importtime(result.stderr)
+            top_level = [(name, cumulative) for name, cumulative, depth in imports if depth == 1]
+            slowest = sorted(top_level, key=lambda item: item[1], reverse=True)[:3]
+            median = statistics.median(times) * 1000
+            print(f"{command:>10} {median:>10.1f} {min(times) * 1000:>8.1f} "
+                  f"{sum(cumulative for _, cumulative in top_level) / 1000:>11.1f}  "
+                  + ', '.join(f"{name} {cumulative / 1000:.1f}" for name, cumulative in slowest))
+
+            loaded = {name for name, _, _ in imports}
+            heavy = [module for module in HEAVY_MODULES if module in loaded]
+            if heavy:
+                failures.append(f"{command} imports {', '.join(heavy)}")
+            if median > args.budget_ms:
+                failures.append(f"{command} takes {median:.1f} ms > {args.budget_ms} ms")
+        print(f"{'python':>10} {'':>10} {baseline * 1000:>8.1f}  interpreter startup alone")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        raise SystemExit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import html
+import json
+import random
+
+QUESTION_TYPES = {
+    'QUESTION_TYPE_SINGLE': 1,
+    'QUESTION_TYPE_MULTIPLE': 2,
+    'QUESTION_TYPE_MATCHING': 3,
+}
+
+WORDS = (
+    'пациент', 'препарат', 'диагноз', 'лечение', 'симптом', 'артерия', 'клетка',
+    'синдром', 'терапия', 'ткань', 'фермент', 'рецептор', 'доза', 'инфекция',
+)
+
+def make_text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+def make_answer(rng, uid, image_rate):
+    images = [f"{rng.randrange(10 ** 6)}.png"] if rng.random() < image_rate else []
+    return {'uid': uid, 'answer': make_text(rng, rng.randint(1, 8)), 'images': images}
+
+def make_question(rng, question_id, matching_rate=0.2, image_rate=0.1):
+    question_type = 'QUESTION_TYPE_MATCHING' if rng.random() < matching_rate else rng.choice(
+        ('QUESTION_TYPE_SINGLE', 'QUESTION_TYPE_MULTIPLE'))
+    question = {
+        'id': question_id,
+        'text': make_text(rng, rng.randint(6, 30)),
+        'type': QUESTION_TYPES[question_type],
+        'images': [f"{rng.randrange(10 ** 6)}.jpg"] if rng.random() < image_rate else [],
+        'answers': [make_answer(rng, f"{question_id}-{i}", image_rate) for i in range(rng.randint(3, 6))],
+    }
+    if question_type == 'QUESTION_TYPE_MATCHING':
+        question['answers_draggable'] = [
+            make_answer(rng, f"{question_id}-d{i}", image_rate) for i in range(len(question['answers']))
+        ]
+    return question
+
+def make_questions(count, seed=0, **kwargs):
+    rng = random.Random(seed)
+    return [make_question(rng, i, **kwargs) for i in range(count)]
+
+def make_page(questions, filler_kb=256):
+    filler_block = '<div class="row"><span class="cell">Lorem ipsum dolor sit amet</span></div>\n'
+    filler = filler_block * (filler_kb * 1024 // len(filler_block) + 1)
+    questions_attr = html.escape(json.dumps(questions, ensure_ascii=False), quote=True)
+    types_attr = html.escape(json.dumps(QUESTION_TYPES), quote=True)
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Тестирование</title></head>\n'
+        f'<body><div id="app">{filler}'
+        f'<questions v-bind:questions="{questions_attr}" v-bind:question-types="{types_attr}"></questions>'
+        f'{filler}</div></body></html>\n'
+    ).encode('utf-8')
@@ -1,80 +1,348 @@
 import sys
 import os
-from PySide6.QtCore import (QCoreApplication, QDate, QDateTime, QLocale,
-    QMetaObject, QObject, QPoint, QRect,
-    QSize, QTime, QUrl, Qt, QThread, Signal)
-from PySide6.QtGui import (QAction, QBrush, QColor, QConicalGradient,
-    QCursor, QFont, QFontDatabase, QGradient,
-    QIcon, QImage, QKeySequence, QLinearGradient,
-    QPainter, QPalette, QPixmap, QRadialGradient,
-    QTransform)
-from PySide6.QtWidgets import (QApplication, QFrame, QMainWindow, QMenu,
-    QMenuBar, QPushButton, QScrollArea, QSizePolicy,
-    QStatusBar, QVBoxLayout, QWidget, QLabel, QDialog, QMessageBox)
-
-import subprocess
-from pathlib import Path
+import html
 import logging
-
+import queue
 import threading
-import time
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-import json
+from collections import OrderedDict
+from pathlib import Path
+from PySide6.QtCore import (QAbstractListModel, QAbstractTableModel, QCoreApplication, QModelIndex, Qt, QThread,
+                            QTimer, Signal)
+from PySide6.QtGui import QAction
+from PySide6.QtWidgets import QApplication, QDialog, QMainWindow, QMessageBox
 
-import platform
+# The intercept modules import each other as top-level modules, the same way
+# mitmdump and cli.py load them.
+INTERCEPT_DIR = Path(__file__).resolve().parent.parent / "intercept"
+sys.path.insert(0, str(INTERCEPT_DIR))
 
+import ipc
+from browse import (SESSION_COLUMN, TEXT_COLUMN, TIME_COLUMN, TYPE_COLUMN, capture_rows, load_details, load_record,
+                    query_rows)
+from capture_log import LogFollower
+from identity import TAG_RE
+from render import question_text_lines
+from sessions import SessionTable, save_sessions, session_names
 from src.gui.mainwindow_base import Ui_MainWindow
 from src.gui.settings_base import Ui_Dialog
 
-class FileWatcherHandler(FileSystemEventHandler):
-    def __init__(self, callback):
-        self.callback = callback
+RECONNECT_INTERVAL = 1000
+# Search runs once typing pauses for this many milliseconds.
+SEARCH_DELAY = 200
+SEARCH_LIMIT = 50
+CAPTURE_COLUMNS = ("Время", "Сессия", "Тип", "Вопрос")
+# Type and text of this many captured questions are kept for the table; the
+# rest are read from the capture log again when scrolled to.
+DETAILS_CACHE = 2000
+# A sorted or filtered table is queried again this long after new captures.
+REQUERY_DELAY = 500
 
-    def on_modified(self, event):
-        if event.src_path.endswith('intercepted_data.json'):
-            self.callback()
+def plain_text(text):
+    return html.unescape(TAG_RE.sub('', text or '')).strip()
 
-    def on_created(self, event):
-        if event.src_path.endswith('intercepted_data.json'):
-            self.callback()
+def preview_text(question):
+    try:
+        lines = question_text_lines(question)
+    except (KeyError, TypeError):
+        lines = [question.get('text') or '']
+    return '\n'.join(plain_text(line) for line in lines)
 
-class FileWatcherThread(QThread):
+class CaptureEventsThread(QThread):
     update_signal = Signal(list)
+    saved_signal = Signal(list)
 
     def __init__(self, directory):
         super().__init__()
         self.directory = directory
-        self.timestamps = set()
-        self.observer = Observer()
-        self.event_handler = FileWatcherHandler(self.process_file)
-        self.observer.schedule(self.event_handler, self.directory, recursive=False)
+        self.address = ipc.default_address(str(directory))
+        self.sessions = SessionTable(str(directory))
+        self.followers = {}
+        self.lock = threading.Lock()
+        self.client = None
 
     def run(self):
-        self.observer.start()
-        try:
-            while True:
-                time.sleep(1)
-        finally:
-            self.observer.stop()
-            self.observer.join()
+        while not self.isInterruptionRequested():
+            # Pick up whatever was captured while we were not connected, then
+            # read the log again only when the proxy reports a capture.
+            self.process_file()
+            try:
+                with ipc.IpcClient(self.address) as client:
+                    self.client = client
+                    for event in client.events():
+                        if event.get('event') == 'capture':
+                            self.process_file()
+                        elif event.get('event') == 'saved':
+                            # Sessions that weren't saved come back with the
+                            # next read.
+                            self.reset()
+                            self.saved_signal.emit(event.get('paths', []))
+                            self.process_file()
+            except (ipc.IpcUnavailable, ipc.IpcError, OSError, ValueError):
+                pass
+            finally:
+                self.client = None
+
+            if not self.isInterruptionRequested():
+                self.msleep(RECONNECT_INTERVAL)
+
+    def stop(self):
+        self.requestInterruption()
+        client = self.client
+        if client is not None:
+            client.shutdown()
+        self.wait()
+
+    def reset(self):
+        with self.lock:
+            self.followers.clear()
 
     def process_file(self):
-        file_path = Path(self.directory) / 'intercepted_data.json'
-        if not file_path.exists():
-            return
+        # Reads what was appended to every session's capture log into table
+        # rows, which only say where each question is.
+        rows = []
+        with self.lock:
+            for name in session_names(str(self.directory)):
+                follower = self.followers.get(name)
+                if follower is None:
+                    follower = self.followers[name] = LogFollower(self.sessions.get(name).capture_log.path)
+                try:
+                    rows.extend(capture_rows(name, follower))
+                except Exception as e:
+                    logging.error(f"Error processing file: {e}")
 
-        try:
-            with open(file_path, 'r', encoding='utf-8-sig') as file:
-                data = json.load(file)
+        if rows:
+            self.update_signal.emit(rows)
 
-            new_timestamps = {entry['timestamp'] for entry in data if 'timestamp' in entry}
-            self.timestamps.update(new_timestamps)
-            sorted_timestamps = sorted(self.timestamps)
-            self.update_signal.emit(sorted_timestamps)
+class CaptureQueryThread(QThread):
+    # Everything the window reads from disk: type and text of the capture
+    # table's rows on screen, whole records for the preview, sorting and
+    # filtering, which read every record, and question bank searches.
+    details_signal = Signal(int, dict)
+    record_signal = Signal(int, object)
+    query_signal = Signal(int, object)
+    search_signal = Signal(int, list, bool)
 
+    def __init__(self, directory):
+        super().__init__()
+        self.jobs = queue.Queue()
+        self.latest_query = 0
+        self.latest_search = 0
+        self.directory = directory
+        # Opened here by the first search, which migrates an older bank, and
+        # closed here on stop: sqlite3 isn't needed before that.
+        self.question_bank = None
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                if self.question_bank is not None:
+                    self.question_bank.close()
+                return
+            kind, generation, *args = job
+            try:
+                if kind == 'details':
+                    self.details_signal.emit(generation, load_details(*args))
+                elif kind == 'record':
+                    self.record_signal.emit(generation, load_record(*args))
+                elif kind == 'search':
+                    if generation == self.latest_search:
+                        self.search_signal.emit(generation, *self.search(*args))
+                elif generation == self.latest_query:
+                    # A newer sort or filter replaces this one, even halfway.
+                    order = query_rows(*args, cancelled=lambda: generation != self.latest_query)
+                    if order is not None:
+                        self.query_signal.emit(generation, order)
+            except Exception as e:
+                logging.error(f"Error reading captures: {e}")
+
+    def search(self, text, limit):
+        # The bank is read directly: SQLite lets the proxy keep writing to it.
+        # Returns the questions and whether only the newest matches were ranked.
+        try:
+            if self.question_bank is None:
+                from question_bank import BANK_FILE, QuestionBank
+                self.question_bank = QuestionBank(os.path.join(self.directory, BANK_FILE))
+            questions = list(self.question_bank.search(text, limit=limit))
+            return questions, bool(questions) and self.question_bank.search_truncated(text)
         except Exception as e:
-            logging.error(f"Error processing file: {e}")
+            logging.error(f"Error searching the question bank: {e}")
+            return [], False
+
+    def submit(self, kind, generation, *args):
+        if kind == 'query':
+            self.latest_query = generation
+        elif kind == 'search':
+            self.latest_search = generation
+        self.jobs.put((kind, generation, *args))
+
+    def stop(self):
+        self.jobs.put(None)
+        self.wait()
+
+class CaptureTableModel(QAbstractTableModel):
+    # Captured questions, as many as the logs hold: rows only know where
+    # their question is, and the view asks for the few it shows.
+    def __init__(self, worker, parent=None):
+        super().__init__(parent)
+        self.worker = worker
+        self.rows = []
+        # Positions in rows in display order while sorted or filtered, None
+        # shows them as captured.
+        self.order = None
+        self.sort_column = TIME_COLUMN
+        self.descending = False
+        self.filter_text = ''
+        # Sort and filter results are applied only for the latest query, and
+        # queried again if rows came in while it ran.
+        self.generation = 0
+        self.queried = 0
+        # Bumped by clear(), so details read from logs since saved are dropped.
+        self.epoch = 0
+        self.details = OrderedDict()
+        self.pending = {}
+        self.requested = set()
+
+        self.details_timer = QTimer(self)
+        self.details_timer.setSingleShot(True)
+        self.details_timer.setInterval(0)
+        self.details_timer.timeout.connect(self.request_details)
+        self.requery_timer = QTimer(self)
+        self.requery_timer.setSingleShot(True)
+        self.requery_timer.setInterval(REQUERY_DELAY)
+        self.requery_timer.timeout.connect(self.refresh)
+        worker.details_signal.connect(self.add_details)
+        worker.query_signal.connect(self.set_order)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows) if self.order is None else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(CAPTURE_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return CAPTURE_COLUMNS[section]
+        return None
+
+    def row(self, position):
+        return self.rows[position if self.order is None else self.order[position]]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        row = self.row(index.row())
+        column = index.column()
+        if column == TIME_COLUMN:
+            return row.timestamp
+        if column == SESSION_COLUMN:
+            return row.session
+        details = self.details.get(row.ref)
+        if details is None:
+            if row.ref not in self.requested:
+                self.pending[row.ref] = row
+                self.details_timer.start()
+            return "…" if role == Qt.DisplayRole else None
+        self.details.move_to_end(row.ref)
+        return details[0] if column == TYPE_COLUMN else details[1]
+
+    def request_details(self):
+        # Everything painted in one go is read in one job.
+        rows = list(self.pending.values())
+        self.pending = {}
+        self.requested.update(row.ref for row in rows)
+        self.worker.submit('details', self.epoch, rows)
+
+    def add_details(self, epoch, details):
+        if epoch != self.epoch:
+            return
+        self.requested.difference_update(details)
+        self.details.update(details)
+        while len(self.details) > DETAILS_CACHE:
+            self.details.popitem(last=False)
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, TYPE_COLUMN), self.index(self.rowCount() - 1, TEXT_COLUMN))
+
+    def as_captured(self):
+        return not self.filter_text.strip() and self.sort_column == TIME_COLUMN and not self.descending
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.descending = order == Qt.DescendingOrder
+        self.refresh()
+
+    def set_filter(self, text):
+        self.filter_text = text
+        self.refresh()
+
+    def refresh(self):
+        self.generation += 1
+        self.queried = len(self.rows)
+        if self.as_captured():
+            self.set_order(self.generation, None)
+        else:
+            self.worker.submit('query', self.generation, list(self.rows), self.sort_column, self.descending,
+                               self.filter_text)
+
+    def set_order(self, generation, order):
+        if generation != self.generation:
+            return
+        self.beginResetModel()
+        self.order = order
+        self.endResetModel()
+        if self.queried < len(self.rows):
+            self.requery_timer.start()
+
+    def append(self, rows):
+        if not rows:
+            return
+        if self.order is None:
+            first = len(self.rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self.rows.extend(rows)
+            self.endInsertRows()
+        else:
+            # Shown once the sort or filter is run again with them.
+            self.rows.extend(rows)
+            self.requery_timer.start()
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows = []
+        self.order = None if self.as_captured() else []
+        self.generation += 1
+        self.queried = 0
+        self.epoch += 1
+        self.details.clear()
+        self.pending = {}
+        self.requested.clear()
+        self.endResetModel()
+
+class SearchResultsModel(QAbstractListModel):
+    # Question texts, with their answers as the tooltip.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.questions = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.questions)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        question = self.questions[index.row()]
+        if role == Qt.DisplayRole:
+            return plain_text(question.get('text'))
+        if role == Qt.ToolTipRole:
+            return '\n'.join(plain_text(answer.get('answer')) for answer in question.get('answers') or ())
+        return None
+
+    def set_questions(self, questions):
+        self.beginResetModel()
+        self.questions = questions
+        self.endResetModel()
 
 class SettingsDialog(QDialog, Ui_Dialog):
     def __init__(self, parent=None):
@@ -96,6 +364,9 @@ class SettingsDialog(QDialog, Ui_Dialog):
         self.accept()
     
     def install_dependencies(self):
+        import platform
+        import subprocess
+
         subprocess.run(["pip", "install", "-r", "requirements.txt"], capture_output=True, text=True)
         
         os_name = platform.system()
@@ -122,14 +393,49 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         self.script_path = Path(__file__).resolve().parent.parent / "intercept"
 
+        # Created on first start: importing the proxy pulls in asyncio and
+        # mitmproxy, which the window doesn't need to show up.
+        self.proxy = None
+
         self.proxyButton.clicked.connect(self.toggle_script)
         self.saveButton.clicked.connect(self.save_intercepted_data)
 
-        self.scroll_layout = QVBoxLayout(self.scrollAreaWidgetContents_2)
-        
-        self.file_watcher_thread = FileWatcherThread(self.script_path)
-        self.file_watcher_thread.update_signal.connect(self.update_scroll_area)
-        self.file_watcher_thread.start()
+        self.query_thread = CaptureQueryThread(str(self.script_path))
+        self.query_thread.record_signal.connect(self.show_record)
+        self.query_thread.search_signal.connect(self.show_search_results)
+        self.search_generation = 0
+        self.query_thread.start()
+        # Bumped for every question previewed, so a slow read can't replace
+        # the preview of a later one.
+        self.preview_generation = 0
+
+        self.captures_model = CaptureTableModel(self.query_thread, self)
+        self.captures_model.modelReset.connect(self.show_capture_count)
+        self.capturesView.setModel(self.captures_model)
+        self.capturesView.setColumnWidth(TIME_COLUMN, 130)
+        self.capturesView.setColumnWidth(SESSION_COLUMN, 80)
+        self.capturesView.setColumnWidth(TYPE_COLUMN, 80)
+        self.capturesView.sortByColumn(TIME_COLUMN, Qt.AscendingOrder)
+        self.capturesView.selectionModel().currentRowChanged.connect(self.preview_capture)
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(SEARCH_DELAY)
+        self.filter_timer.timeout.connect(lambda: self.captures_model.set_filter(self.filterEdit.text()))
+        self.filterEdit.textChanged.connect(lambda text: self.filter_timer.start())
+
+        self.search_model = SearchResultsModel(self)
+        self.searchResultsView.setModel(self.search_model)
+        self.searchResultsView.selectionModel().currentChanged.connect(self.preview_search_result)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY)
+        self.search_timer.timeout.connect(self.search_questions)
+        self.searchEdit.textChanged.connect(lambda text: self.search_timer.start())
+
+        self.capture_events_thread = CaptureEventsThread(self.script_path)
+        self.capture_events_thread.update_signal.connect(self.add_captures)
+        self.capture_events_thread.saved_signal.connect(self.clear_captures)
+        self.capture_events_thread.start()
 
         self.actionSettings = QAction("&Настройки", self)
         self.menuSettings.addAction(self.actionSettings)
@@ -143,42 +449,113 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def start_script(self):
         logging.info('Starting script...')
-        self.process = subprocess.Popen(["python", "cli.py", "start"], cwd=self.script_path)
+        try:
+            if self.proxy is None:
+                from proxy import EmbeddedProxy
+                self.proxy = EmbeddedProxy(quiet=True, intercept_dir=str(self.script_path))
+            self.proxy.start()
+        except Exception as e:
+            logging.error(f"Error starting proxy: {e}")
+            QMessageBox.critical(self, "Прокси", f"Не удалось запустить прокси: {e}")
+            return
         self.proxyButton.setText(QCoreApplication.translate("MainWindow", u"\u041e\u0441\u0442\u0430\u043d\u043e\u0432\u0438\u0442\u044c", None))
         self.script_running = True
         logging.info('Script started')
 
     def stop_script(self):
         logging.info('Stopping script...')
-        subprocess.run(["python", "cli.py", "stop"], cwd=self.script_path)
+        if self.proxy is not None and self.proxy.is_running():
+            self.proxy.stop()
+        else:
+            try:
+                ipc.request('stop', self.capture_events_thread.address, timeout=30)
+            except ipc.IpcUnavailable:
+                pass
+            except ipc.IpcError as e:
+                logging.error(f"Error stopping proxy: {e}")
         self.proxyButton.setText(QCoreApplication.translate("MainWindow", u"\u0421\u0442\u0430\u0440\u0442", None))
         self.script_running = False
         logging.info('Script stopped')
     
     def save_intercepted_data(self):
         logging.info('Saving intercepted data...')
-        subprocess.run(["python", "cli.py", "save"], cwd=self.script_path)
-        logging.info('Intercepted data saved')
-        
-        for i in reversed(range(self.scroll_layout.count())):
-            widget = self.scroll_layout.itemAt(i).widget()
-            if widget:
-                widget.setParent(None)
-
-    def update_scroll_area(self, timestamps):
-        for i in reversed(range(self.scroll_layout.count())):
-            widget = self.scroll_layout.itemAt(i).widget()
-            if widget:
-                widget.setParent(None)
-
-        for index, timestamp in enumerate(timestamps):
-            label = QLabel(f"{index + 1} - {timestamp}")
-            self.scroll_layout.addWidget(label)
-    
+        try:
+            reply = ipc.request('save', self.capture_events_thread.address, timeout=60)
+        except ipc.IpcUnavailable:
+            from export import DEFAULT_FORMATS, OUTPUT_DIR
+            paths = save_sessions(self.capture_events_thread.sessions, DEFAULT_FORMATS,
+                                  str(self.script_path / OUTPUT_DIR))
+        except ipc.IpcError as e:
+            # The proxy may still be saving, the logs must not be saved here too.
+            logging.error(f"Error saving intercepted data: {e}")
+            QMessageBox.critical(self, "Сохранение", f"Прокси не ответил, сохранение может ещё идти: {e}")
+            return
+        else:
+            if not reply['ok']:
+                logging.error(f"Error saving intercepted data: {reply['error']}")
+                QMessageBox.critical(self, "Сохранение", f"Не удалось сохранить: {reply['error']}")
+                return
+            paths = reply['paths']
+        logging.info(f'Intercepted data saved to {paths}')
+
+        self.capture_events_thread.reset()
+        self.clear_captures()
+
+    def clear_captures(self, paths=None):
+        self.captures_model.clear()
+        self.previewText.clear()
+
+    def add_captures(self, rows):
+        scroll_bar = self.capturesView.verticalScrollBar()
+        at_bottom = scroll_bar.value() == scroll_bar.maximum()
+        self.captures_model.append(rows)
+        if at_bottom and self.captures_model.order is None:
+            self.capturesView.scrollToBottom()
+
+    def show_capture_count(self):
+        if self.captures_model.filter_text.strip():
+            self.statusbar.showMessage(f"Показано вопросов: {self.captures_model.rowCount()} "
+                                       f"из {len(self.captures_model.rows)}")
+
+    def preview_capture(self, current, previous=None):
+        # The record is read by the query thread, the table only knows where it is.
+        self.preview_generation += 1
+        if current.isValid():
+            self.query_thread.submit('record', self.preview_generation, self.captures_model.row(current.row()))
+
+    def show_record(self, generation, record):
+        if generation == self.preview_generation:
+            self.previewText.setPlainText(preview_text(record) if record is not None else "Вопрос уже сохранён")
+
+    def preview_search_result(self, current, previous=None):
+        self.preview_generation += 1
+        if current.isValid():
+            self.previewText.setPlainText(preview_text(self.search_model.questions[current.row()]))
+
+    def search_questions(self):
+        # Searched on the query thread: the first search may have to migrate
+        # the bank, and only the latest search's results are shown.
+        self.search_generation += 1
+        self.query_thread.submit('search', self.search_generation, self.searchEdit.text(), SEARCH_LIMIT)
+
+    def show_search_results(self, generation, questions, truncated):
+        if generation != self.search_generation:
+            return
+        self.search_model.set_questions(questions)
+        if self.searchEdit.text().strip():
+            message = f"Найдено вопросов: {len(questions)}"
+            if truncated:
+                message += " (совпадений слишком много, ранжированы только новейшие; уточните запрос)"
+            self.statusbar.showMessage(message)
+        else:
+            self.statusbar.clearMessage()
+
     def closeEvent(self, event):
         logging.info('Application is closing...')
         if self.script_running:
             self.stop_script()
+        self.capture_events_thread.stop()
+        self.query_thread.stop()
         event.accept()
 
     def open_settings_dialog(self):
@@ -16,28 +16,29 @@ from PySide6.QtGui import (QAction, QBrush, QColor, QConicalGradient,
     QIcon, QImage, QKeySequence, QLinearGradient,
     QPainter, QPalette, QPixmap, QRadialGradient,
     QTransform)
-from PySide6.QtWidgets import (QApplication, QFrame, QMainWindow, QMenu,
-    QMenuBar, QPushButton, QScrollArea, QSizePolicy,
-    QStatusBar, QVBoxLayout, QWidget)
+from PySide6.QtWidgets import (QAbstractItemView, QApplication, QFrame, QHeaderView,
+    QLineEdit, QListView, QMainWindow, QMenu,
+    QMenuBar, QPushButton, QSizePolicy, QStatusBar,
+    QTableView, QTextBrowser, QVBoxLayout, QWidget)
 
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
         if not MainWindow.objectName():
             MainWindow.setObjectName(u"MainWindow")
         MainWindow.setWindowModality(Qt.WindowModality.NonModal)
-        MainWindow.resize(500, 400)
+        MainWindow.resize(800, 500)
         sizePolicy = QSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
         sizePolicy.setHorizontalStretch(0)
         sizePolicy.setVerticalStretch(0)
         sizePolicy.setHeightForWidth(MainWindow.sizePolicy().hasHeightForWidth())
         MainWindow.setSizePolicy(sizePolicy)
-        MainWindow.setMinimumSize(QSize(500, 400))
-        MainWindow.setMaximumSize(QSize(500, 400))
+        MainWindow.setMinimumSize(QSize(800, 500))
+        MainWindow.setMaximumSize(QSize(800, 500))
         self.centralwidget = QWidget(MainWindow)
         self.centralwidget.setObjectName(u"centralwidget")
         self.verticalLayoutWidget = QWidget(self.centralwidget)
         self.verticalLayoutWidget.setObjectName(u"verticalLayoutWidget")
-        self.verticalLayoutWidget.setGeometry(QRect(280, 10, 211, 341))
+        self.verticalLayoutWidget.setGeometry(QRect(580, 10, 211, 441))
         self.buttonsLayout = QVBoxLayout(self.verticalLayoutWidget)
         self.buttonsLayout.setObjectName(u"buttonsLayout")
         self.buttonsLayout.setContentsMargins(0, 0, 0, 0)
@@ -53,23 +54,46 @@ class Ui_MainWindow(object):
 
         self.buttonsLayout.addWidget(self.saveButton)
 
+        self.searchEdit = QLineEdit(self.verticalLayoutWidget)
+        self.searchEdit.setObjectName(u"searchEdit")
+        self.searchEdit.setClearButtonEnabled(True)
+
+        self.buttonsLayout.addWidget(self.searchEdit)
+
+        self.searchResultsView = QListView(self.verticalLayoutWidget)
+        self.searchResultsView.setObjectName(u"searchResultsView")
+        self.searchResultsView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.searchResultsView.setWordWrap(True)
+
+        self.buttonsLayout.addWidget(self.searchResultsView)
+
         self.frame = QFrame(self.centralwidget)
         self.frame.setObjectName(u"frame")
-        self.frame.setGeometry(QRect(10, 10, 261, 341))
+        self.frame.setGeometry(QRect(10, 10, 561, 441))
         self.frame.setFrameShape(QFrame.Shape.StyledPanel)
         self.frame.setFrameShadow(QFrame.Shadow.Raised)
-        self.scrollArea = QScrollArea(self.frame)
-        self.scrollArea.setObjectName(u"scrollArea")
-        self.scrollArea.setGeometry(QRect(0, 0, 261, 341))
-        self.scrollArea.setWidgetResizable(True)
-        self.scrollAreaWidgetContents_2 = QWidget()
-        self.scrollAreaWidgetContents_2.setObjectName(u"scrollAreaWidgetContents_2")
-        self.scrollAreaWidgetContents_2.setGeometry(QRect(0, 0, 259, 339))
-        self.scrollArea.setWidget(self.scrollAreaWidgetContents_2)
+        self.filterEdit = QLineEdit(self.frame)
+        self.filterEdit.setObjectName(u"filterEdit")
+        self.filterEdit.setGeometry(QRect(0, 0, 561, 24))
+        self.filterEdit.setClearButtonEnabled(True)
+        self.capturesView = QTableView(self.frame)
+        self.capturesView.setObjectName(u"capturesView")
+        self.capturesView.setGeometry(QRect(0, 30, 561, 261))
+        self.capturesView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.capturesView.setAlternatingRowColors(True)
+        self.capturesView.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.capturesView.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.capturesView.setSortingEnabled(True)
+        self.capturesView.setWordWrap(False)
+        self.capturesView.horizontalHeader().setStretchLastSection(True)
+        self.capturesView.verticalHeader().setVisible(False)
+        self.previewText = QTextBrowser(self.frame)
+        self.previewText.setObjectName(u"previewText")
+        self.previewText.setGeometry(QRect(0, 297, 561, 144))
         MainWindow.setCentralWidget(self.centralwidget)
         self.menubar = QMenuBar(MainWindow)
         self.menubar.setObjectName(u"menubar")
-        self.menubar.setGeometry(QRect(0, 0, 500, 22))
+        self.menubar.setGeometry(QRect(0, 0, 800, 22))
         self.menuSettings = QMenu(self.menubar)
         self.menuSettings.setObjectName(u"menuSettings")
         MainWindow.setMenuBar(self.menubar)
@@ -91,6 +115,8 @@ class Ui_MainWindow(object):
         MainWindow.setWindowTitle(QCoreApplication.translate("MainWindow", u"KS Intercept", None))
         self.proxyButton.setText(QCoreApplication.translate("MainWindow", u"\u0417\u0430\u043f\u0443\u0441\u043a", None))
         self.saveButton.setText(QCoreApplication.translate("MainWindow", u"\u0421\u043e\u0445\u0440\u0430\u043d\u0438\u0442\u044c", None))
+        self.filterEdit.setPlaceholderText(QCoreApplication.translate("MainWindow", u"\u0424\u0438\u043b\u044c\u0442\u0440 \u0437\u0430\u0445\u0432\u0430\u0447\u0435\u043d\u043d\u044b\u0445 \u0432\u043e\u043f\u0440\u043e\u0441\u043e\u0432", None))
+        self.searchEdit.setPlaceholderText(QCoreApplication.translate("MainWindow", u"\u041f\u043e\u0438\u0441\u043a \u0432\u043e\u043f\u0440\u043e\u0441\u043e\u0432", None))
         self.menuSettings.setTitle(QCoreApplication.translate("MainWindow", u"\u041d\u0430\u0441\u0442\u0440\u043e\u0439\u043a\u0438", None))
     # retranslateUi
 
@@ -0,0 +1,99 @@
+import functools
+import html
+from datetime import datetime
+from capture_log import iter_entries, read_record_at
+from identity import TAG_RE, canonical_text
+
+# What the GUI's capture table needs to show, sort and filter captured
+# questions without holding them: a row keeps where its record is in the
+# capture log, and type, text and answers are read back from there for the
+# rows on screen or by a background query.
+
+TIMESTAMP_FORMAT = "%d-%m-%Y_%H-%M-%S"
+TIME_COLUMN, SESSION_COLUMN, TYPE_COLUMN, TEXT_COLUMN = range(4)
+PREVIEW_LENGTH = 200
+# Sort keys of the text column only look this far into the question.
+SORT_TEXT_LENGTH = 100
+
+class CaptureRow:
+    __slots__ = ('session', 'timestamp', 'log', 'ref')
+
+    def __init__(self, session, timestamp, log, ref):
+        self.session = session
+        self.timestamp = timestamp
+        # The session's capture log and the (file identity, offset) of the
+        # record in it, see LogFollower.read_entries.
+        self.log = log
+        self.ref = ref
+
+def capture_rows(session, follower):
+    # Rows for whatever was appended to the follower's log since the last call.
+    return [CaptureRow(session, record.get('timestamp') or '', follower.path, ref)
+            for ref, record in follower.read_entries()]
+
+@functools.lru_cache(maxsize=1024)
+def time_key(timestamp):
+    # Capture stamps don't sort as text.
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    except ValueError:
+        return datetime.min
+
+def row_details(record):
+    # (type, one-line text) for the table.
+    text = html.unescape(TAG_RE.sub(' ', record.get('text') or ''))
+    return str(record.get('type') or ''), ' '.join(text.split())[:PREVIEW_LENGTH]
+
+def load_details(rows):
+    # {ref: details} for every row, blank for records no longer in their
+    # capture log, e.g. saved meanwhile.
+    details = {}
+    for row in rows:
+        record = read_record_at(row.log, *row.ref)
+        details[row.ref] = row_details(record) if record is not None else ('', '')
+    return details
+
+def load_record(row):
+    return read_record_at(row.log, *row.ref)
+
+def scan_logs(rows, text, column, cancelled=None):
+    # Reads every log the rows come from once and returns {ref: (matches the
+    # filter, sort key)}: only what the query needs is kept, not the records.
+    wanted = canonical_text(text)
+    scanned = {}
+    for log in dict.fromkeys(row.log for row in rows):
+        if cancelled is not None and cancelled():
+            return None
+        for ref, record in iter_entries(log):
+            folded = canonical_text(record.get('text')) if wanted or column == TEXT_COLUMN else ''
+            if column == TYPE_COLUMN:
+                key = str(record.get('type') or '')
+            elif column == TEXT_COLUMN:
+                key = folded[:SORT_TEXT_LENGTH]
+            else:
+                key = None
+            scanned[ref] = (wanted in folded, key)
+    return scanned
+
+def query_rows(rows, column=TIME_COLUMN, descending=False, text='', cancelled=None):
+    # Positions in `rows` that match the filter text, ordered by the column.
+    # Text and type are read from the logs, so this belongs off the GUI
+    # thread; `cancelled` is polled to give up on a query already replaced.
+    text = text.strip()
+    scanned = None
+    if text or column in (TYPE_COLUMN, TEXT_COLUMN):
+        scanned = scan_logs(rows, text, column, cancelled)
+        if scanned is None:
+            return None
+
+    positions = range(len(rows))
+    if text:
+        positions = [i for i in positions if scanned.get(rows[i].ref, (False,))[0]]
+    if column == TIME_COLUMN:
+        key = lambda i: time_key(rows[i].timestamp)
+    elif column == SESSION_COLUMN:
+        key = lambda i: rows[i].session
+    else:
+        key = lambda i: scanned.get(rows[i].ref, (False, ''))[1]
+    # Stable, so equal keys keep capture order either way.
+    return sorted(positions, key=key, reverse=descending)
@@ -0,0 +1,306 @@
+import json
+import os
+import re
+import time
+import fastjson
+
+CAPTURE_FILE = 'intercepted_data.jsonl'
+# Records that failed validation, kept with the reason instead of being lost.
+QUARANTINE_FILE = 'quarantine.jsonl'
+
+# A log can be rotated into sealed segments, intercepted_data.000001.jsonl and
+# so on, next to the active file. The readers below go through the segments
+# oldest first and then the active file, so they see one log.
+
+def sealed_segments(path):
+    # (number, path) of the sealed segments, oldest first.
+    directory, name = os.path.split(path)
+    stem, extension = os.path.splitext(name)
+    pattern = re.compile(re.escape(stem) + r'\.(\d+)' + re.escape(extension) + '$')
+    try:
+        names = os.listdir(directory or '.')
+    except FileNotFoundError:
+        return []
+    segments = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            segments.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(segments)
+
+def segment_paths(path):
+    # Sealed segments in order, then the active file, whether it exists or not.
+    return [segment for _, segment in sealed_segments(path)] + [path]
+
+def next_segment_path(path):
+    segments = sealed_segments(path)
+    number = segments[-1][0] + 1 if segments else 1
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.{number:06d}{extension}"
+
+class CaptureLog:
+    # With segment_bytes or segment_seconds set, the active file is sealed
+    # into a segment once it grows past that size or age, so no single file
+    # grows without limit.
+    def __init__(self, path=CAPTURE_FILE, fsync_every=32, fsync_interval=1.0, segment_bytes=0, segment_seconds=0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.file = None
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        self.size = 0
+        self.opened_at = time.monotonic()
+
+    def open(self):
+        if self.file is not None and not self.is_current():
+            # `save` removed the log behind our back, start a fresh one.
+            self.file.close()
+            self.file = None
+        if self.file is None:
+            recover_tail(self.path)
+            self.file = open(self.path, 'ab')
+            self.size = os.fstat(self.file.fileno()).st_size
+            self.opened_at = time.monotonic()
+        return self
+
+    def is_current(self):
+        try:
+            on_disk = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        opened = os.fstat(self.file.fileno())
+        return (on_disk.st_dev, on_disk.st_ino) == (opened.st_dev, opened.st_ino)
+
+    def append(self, records):
+        if not records:
+            return
+        self.open()
+        data = b''.join(encode_record(record) for record in records)
+        self.file.write(data)
+        self.file.flush()
+        self.pending += len(records)
+        self.size += len(data)
+
+        now = time.monotonic()
+        if ((self.segment_bytes and self.size >= self.segment_bytes)
+                or (self.segment_seconds and now - self.opened_at >= self.segment_seconds)):
+            self.rotate()
+        elif self.pending >= self.fsync_every or now - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def rotate(self):
+        # Seals the active file; the next append starts a new one.
+        self.close()
+        try:
+            os.replace(self.path, next_segment_path(self.path))
+        except PermissionError:
+            # Windows doesn't rename a file a reader has open; the next
+            # append tries again.
+            pass
+
+    def seal(self):
+        # Seals the active file, unless it is missing or empty, and returns
+        # every sealed segment; None when Windows kept the active file from
+        # being renamed.
+        self.close()
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            self.rotate()
+            if os.path.exists(self.path):
+                return None
+        return [segment for _, segment in sealed_segments(self.path)]
+
+    def sync(self):
+        if self.file is None:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.file is None:
+            return
+        self.sync()
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+def discard(path=CAPTURE_FILE, segments=None):
+    # Removes the log, or only the given files of it.
+    for segment in segment_paths(path) if segments is None else segments:
+        try:
+            os.remove(segment)
+        except FileNotFoundError:
+            pass
+        except PermissionError:
+            # Windows refuses to delete a file the proxy still holds open.
+            with open(segment, 'r+b') as file:
+                file.truncate(0)
+
+def log_size(path=CAPTURE_FILE):
+    size = 0
+    for segment in segment_paths(path):
+        try:
+            size += os.path.getsize(segment)
+        except FileNotFoundError:
+            pass
+    return size
+
+def encode_record(record):
+    return fastjson.dumps_line(record)
+
+def recover_tail(path):
+    # A crash can leave the last record without its trailing newline. Keep it if
+    # it is complete JSON, otherwise cut the file back to the last full record
+    # so that new appends don't get glued onto garbage.
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'rb+') as file:
+        size = file.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+
+        block = 4096
+        position = size
+        tail = b''
+        while position > 0:
+            step = min(block, position)
+            position -= step
+            file.seek(position)
+            tail = file.read(step) + tail
+            newline = tail.rfind(b'\n')
+            if newline != -1:
+                break
+
+        newline = tail.rfind(b'\n')
+        if newline == len(tail) - 1:
+            return
+
+        last_line = tail[newline + 1:]
+        try:
+            json.loads(last_line.decode('utf-8'))
+        except ValueError:
+            file.truncate(position + newline + 1 if newline != -1 else 0)
+        else:
+            # The scan above left the position inside the file when the
+            # record spans more than one block.
+            file.seek(0, os.SEEK_END)
+            file.write(b'\n')
+
+def read_entries(path=CAPTURE_FILE, offset=0):
+    # Returns (offset, record) for the complete records stored after `offset`
+    # and the offset to continue from. A partially written last line is left
+    # for the next call.
+    entries = []
+    if not os.path.exists(path):
+        return entries, offset
+
+    with open(path, 'rb') as file:
+        if file.seek(0, os.SEEK_END) < offset:
+            offset = 0
+        file.seek(offset)
+        for line in file:
+            if not line.endswith(b'\n'):
+                break
+            record = decode_line(line)
+            if record is not None:
+                entries.append((offset, record))
+            offset += len(line)
+
+    return entries, offset
+
+def read_records(path=CAPTURE_FILE, offset=0):
+    entries, offset = read_entries(path, offset)
+    return [record for _, record in entries], offset
+
+def file_identity(path):
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino
+
+def read_record_at(path, identity, offset):
+    # The record at `offset` of whichever file of the log has that identity,
+    # None once the file is gone, e.g. saved.
+    for segment in segment_paths(path):
+        try:
+            if file_identity(segment) != identity:
+                continue
+            with open(segment, 'rb') as file:
+                file.seek(offset)
+                return decode_line(file.readline())
+        except FileNotFoundError:
+            continue
+    return None
+
+def iter_records(path=CAPTURE_FILE, segments=None):
+    for segment in segment_paths(path) if segments is None else segments:
+        if not os.path.exists(segment):
+            continue
+        with open(segment, 'rb') as file:
+            for line in file:
+                record = decode_line(line)
+                if record is not None:
+                    yield record
+
+def iter_entries(path=CAPTURE_FILE):
+    # The entries LogFollower.read_entries would return on its first call,
+    # one at a time.
+    for segment in segment_paths(path):
+        try:
+            file = open(segment, 'rb')
+        except FileNotFoundError:
+            continue
+        with file:
+            stat = os.fstat(file.fileno())
+            identity = (stat.st_dev, stat.st_ino)
+            offset = 0
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                record = decode_line(line)
+                if record is not None:
+                    yield (identity, offset), record
+                offset += len(line)
+
+class LogFollower:
+    # Returns the records appended to a log and its segments since the last
+    # call. Offsets are kept per file rather than per name, so a file that
+    # was sealed into a segment isn't read again under its new name.
+    def __init__(self, path=CAPTURE_FILE):
+        self.path = path
+        self.offsets = {}
+
+    def read(self):
+        return [record for _, record in self.read_entries()]
+
+    def read_entries(self):
+        # ((file identity, offset), record) pairs; read_record_at finds the
+        # record again from the pair.
+        entries = []
+        offsets = {}
+        for segment in segment_paths(self.path):
+            try:
+                identity = file_identity(segment)
+            except FileNotFoundError:
+                continue
+            new_entries, offsets[identity] = read_entries(segment, self.offsets.get(identity, 0))
+            entries.extend(((identity, offset), record) for offset, record in new_entries)
+        self.offsets = offsets
+        return entries
+
+def decode_line(line):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return fastjson.loads(line)
+    except ValueError:
+        return None
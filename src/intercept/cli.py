@@ -1,11 +1,89 @@
-import click
-import subprocess
 import os
 import signal
-import json
-from datetime import datetime
+import sys
+import ipc
+
+# Everything beyond click, ipc and the format names is imported by the
+# commands that need it, and stop and status run before click is imported,
+# so that they start fast.
 
 PID_FILE = 'proxy.pid'
+# sessions.DEFAULT_SESSION; importing sessions would pull capture_log and
+# hashlib into status.
+DEFAULT_SESSION = 'default'
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intercept.py')
+
+def proxy_running():
+    try:
+        ipc.request('status')
+    except ipc.IpcUnavailable:
+        return False
+    except ipc.IpcError:
+        # Busy, but there.
+        pass
+    return True
+
+def stop_proxy():
+    print("Stopping proxy...")
+    try:
+        ipc.request('stop', timeout=30)
+    except ipc.IpcUnavailable:
+        pass
+    except ipc.IpcError as e:
+        print(f"Error: {e}")
+        return
+    else:
+        if os.path.exists(PID_FILE):
+            os.remove(PID_FILE)
+        print("Proxy stopped.")
+        return
+
+    if not os.path.exists(PID_FILE):
+        print("Proxy is not running.")
+        return
+
+    with open(PID_FILE, 'r') as f:
+        pid = int(f.read())
+
+    try:
+        os.kill(pid, signal.SIGINT)
+        os.remove(PID_FILE)
+        print("Proxy stopped.")
+    except ProcessLookupError:
+        print(f"No process with PID {pid} found. Cleaning up.")
+        os.remove(PID_FILE)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+def show_status():
+    try:
+        reply = ipc.request('status')
+    except ipc.IpcUnavailable:
+        print("Proxy is not running.")
+        return
+    except ipc.IpcError as e:
+        print(f"Error: {e}")
+        return
+
+    print(f"Proxy is running (PID {reply['pid']}).")
+    print(f"Captures: {reply['captures']}, questions: {reply['questions']}, "
+          f"new in question bank: {reply['new_questions']}, pending: {reply['pending']}, errors: {reply['errors']}")
+    sessions = reply.get('sessions', {})
+    if set(sessions) - {DEFAULT_SESSION}:
+        for name, stats in sorted(sessions.items()):
+            print(f"  {name}: captures: {stats['captures']}, questions: {stats['questions']}, "
+                  f"new in question bank: {stats['new_questions']}, duplicates: {stats['duplicates']}")
+
+# Commands without options, run straight from the command line: importing
+# click alone takes longer than they do.
+PLAIN_COMMANDS = {'stop': stop_proxy, 'status': show_status}
+
+if __name__ == "__main__" and len(sys.argv) == 2 and sys.argv[1] in PLAIN_COMMANDS:
+    PLAIN_COMMANDS[sys.argv[1]]()
+    sys.exit()
+
+import click
+from render import DEFAULT_FORMATS, EXPORT_FORMATS
 
 @click.group()
 def cli():
@@ -13,13 +91,24 @@ def cli():
 
 @click.command()
 @click.option('-q', '--quiet', is_flag=True, help='Suppress mitmproxy logs')
-def start(quiet):
-    if os.path.exists(PID_FILE):
+@click.option('-e', '--embedded', is_flag=True, help='Run the proxy inside this process until it is stopped')
+def start(quiet, embedded):
+    import subprocess
+    from proxy import LISTEN_PORT
+
+    if proxy_running():
         print("Proxy is already running.")
         return
-    
+    if os.path.exists(PID_FILE):
+        print("Removing stale PID file.")
+        os.remove(PID_FILE)
+
     print("Starting proxy...")
-    args = ['mitmdump', '--listen-port', '44700', '-s', 'intercept.py']
+    if embedded:
+        run_embedded(quiet)
+        return
+
+    args = ['mitmdump', '--listen-port', str(LISTEN_PORT), '-s', SCRIPT_PATH]
     if quiet:
         args.append('--quiet')
     proxy_process = subprocess.Popen(args)
@@ -29,75 +118,339 @@ def start(quiet):
     
     print("Proxy started. Listening for browser requests...")
 
+def run_embedded(quiet):
+    from proxy import LISTEN_PORT, EmbeddedProxy
+
+    proxy = EmbeddedProxy(LISTEN_PORT, quiet)
+    proxy.start()
+    with open(PID_FILE, 'w') as f:
+        f.write(str(os.getpid()))
+
+    print("Proxy started. Listening for browser requests...")
+    try:
+        proxy.wait()
+    except KeyboardInterrupt:
+        print("Stopping proxy...")
+        proxy.stop()
+    finally:
+        if os.path.exists(PID_FILE):
+            os.remove(PID_FILE)
+    print("Proxy stopped.")
+
 @click.command()
 def stop():
-    if not os.path.exists(PID_FILE):
+    stop_proxy()
+
+@click.command()
+def status():
+    show_status()
+
+@click.command()
+def metrics():
+    try:
+        reply = ipc.request('metrics')
+    except ipc.IpcUnavailable:
         print("Proxy is not running.")
         return
+    except ipc.IpcError as e:
+        print(f"Error: {e}")
+        return
+    print(reply['text'], end='')
 
-    with open(PID_FILE, 'r') as f:
-        pid = int(f.read())
-    
-    print("Stopping proxy...")
+@click.command()
+def profile():
     try:
-        os.kill(pid, signal.SIGINT)
-        os.remove(PID_FILE)
-        print("Proxy stopped.")
-    except ProcessLookupError:
-        print(f"No process with PID {pid} found. Cleaning up.")
-        os.remove(PID_FILE)
-    except Exception as e:
-        print(f"An error occurred: {e}")
+        reply = ipc.request('profile', timeout=60)
+    except ipc.IpcUnavailable:
+        print("Proxy is not running.")
+        return
+    except ipc.IpcError as e:
+        print(f"Error: {e}")
+        return
+    if not reply['ok']:
+        print(f"Error: {reply['error']}")
+        return
+    print(f"Profile written to {' and '.join(reply['paths'])}")
 
-def deduplicate_questions(questions_list):
-    seen = {}
-    deduplicated_list = []
-    
-    for question in questions_list:
-        key = (question['text'], tuple(sorted(answer['uid'] for answer in question['answers'])))
-        if key not in seen:
-            seen[key] = True
-            deduplicated_list.append(question)
-    
-    return deduplicated_list
+def format_option(function):
+    return click.option('-f', '--format', 'formats', multiple=True, default=DEFAULT_FORMATS, show_default=True,
+                        type=click.Choice(EXPORT_FORMATS), help='Output format, can be repeated')(function)
+
+def offline_option(function):
+    return click.option('-o', '--offline', is_flag=True,
+                        help='Download missing images and link exports to the local copies')(function)
 
 @click.command()
-def save():
-    if not os.path.exists('intercepted_data.json'):
+@format_option
+@offline_option
+@click.option('-s', '--session', help='Only save this session, all of them by default')
+def save(formats, offline, session):
+    from export import OUTPUT_DIR
+    from images import ImageStore
+    from sessions import SessionTable, save_sessions
+
+    try:
+        # A running proxy saves by itself, after finishing pending captures.
+        reply = ipc.request('save', timeout=600 if offline else 60,
+                            formats=list(formats), offline=offline, session=session)
+    except ipc.IpcUnavailable:
+        output_paths = save_sessions(SessionTable(), formats, OUTPUT_DIR, ImageStore() if offline else None, session)
+    except ipc.IpcError as e:
+        # Never save the logs here as well: the proxy may still be saving them.
+        print(f"Error: {e}. The proxy may still be saving, check its output.")
+        return
+    else:
+        if not reply['ok']:
+            print(f"Error: {reply['error']}")
+            return
+        output_paths = reply['paths']
+
+    if not output_paths:
         print("No data to save.")
         return
 
-    with open('intercepted_data.json', 'r', encoding='utf-8-sig') as file:
-        questions_list = json.load(file)
+    print(f"Data saved to {' and '.join(output_paths)}")
+
+@click.group()
+def bank():
+    pass
+
+@click.command()
+@click.option('-t', '--type', 'question_type', help='Only count questions of this type')
+def count(question_type):
+    from question_bank import BANK_FILE, QuestionBank
+
+    with QuestionBank(BANK_FILE) as question_bank:
+        if question_type:
+            print(question_bank.count(question_type=question_type))
+            return
+        for name, total in question_bank.types():
+            print(f"{name}: {total}")
+        print(f"Total: {question_bank.count()}")
+
+@click.command()
+@click.argument('text', required=False)
+@click.option('-t', '--type', 'question_type', help='Only show questions of this type')
+@click.option('-n', '--limit', type=int, default=20, show_default=True, help='Maximum number of questions')
+def query(text, question_type, limit):
+    from question_bank import BANK_FILE, QuestionBank
+    from render import render_questions_to_text
+
+    with QuestionBank(BANK_FILE) as question_bank:
+        questions_list = list(question_bank.query(text, question_type, limit))
 
     if not questions_list:
-        print("No data to save.")
+        print("No questions found.")
         return
+    print(render_questions_to_text(questions_list))
 
-    from intercept import render_questions_to_text
+@click.command()
+@click.argument('text')
+@click.option('-t', '--type', 'question_type', help='Only search questions of this type')
+@click.option('-n', '--limit', type=int, default=20, show_default=True, help='Maximum number of questions')
+def search(text, question_type, limit):
+    # Ranked full-text search, unlike query's substring match.
+    import time
+    from question_bank import BANK_FILE, RANK_WINDOW, QuestionBank
+    from render import render_questions_to_text
+
+    with QuestionBank(BANK_FILE) as question_bank:
+        started = time.perf_counter()
+        questions_list = list(question_bank.search(text, question_type, limit))
+        elapsed = time.perf_counter() - started
+        truncated = bool(questions_list) and question_bank.search_truncated(text, question_type)
 
-    questions_list = deduplicate_questions(questions_list)
+    if not questions_list:
+        print("No questions found.")
+        return
+    print(render_questions_to_text(questions_list))
+    print(f"{len(questions_list)} questions in {elapsed * 1000:.1f} ms")
+    if truncated:
+        print(f"More than {RANK_WINDOW} questions match, only the newest {RANK_WINDOW} were ranked; "
+              f"add words to narrow the search.")
+
+@click.command()
+@click.option('-t', '--type', 'question_type', help='Only export questions of this type')
+@format_option
+@offline_option
+def export(question_type, formats, offline):
+    from datetime import datetime
+    from images import ImageStore, image_urls
+    from question_bank import BANK_FILE, QuestionBank
+    from render import write_rendered
+
+    with QuestionBank(BANK_FILE) as question_bank:
+        total = question_bank.count(question_type=question_type)
+        if not total:
+            print("No data to export.")
+            return
+
+        timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
+        os.makedirs('output', exist_ok=True)
+
+        image_url = None
+        if offline:
+            image_store = ImageStore()
+            fetch_with_progress(image_urls(question_bank.query(question_type=question_type)), image_store)
+            image_url = image_store.linker('output')
+
+        output_paths = []
+        for output_format in formats:
+            output_path = os.path.join('output', f"bank_{timestamp}.{output_format}")
+            write_rendered(output_path, question_bank.query(question_type=question_type), output_format, image_url)
+            output_paths.append(output_path)
+
+    print(f"Exported {total} questions to {' and '.join(output_paths)}")
+
+@click.command()
+@click.option('-t', '--type', 'question_type', help='Only look at questions of this type')
+@click.option('--threshold', type=click.FloatRange(0, 1), default=0.8, show_default=True,
+              help='Minimum estimated similarity of grouped questions')
+def duplicates(question_type, threshold):
+    from identity import NearDuplicateIndex
+    from question_bank import BANK_FILE, QuestionBank
+
+    index = NearDuplicateIndex(threshold)
+    texts = {}
+    with QuestionBank(BANK_FILE) as question_bank:
+        for key, question in question_bank.items(question_type):
+            index.add(key, question)
+            texts[key] = question['text']
+
+    groups = index.groups()
+    for number, group in enumerate(groups, start=1):
+        print(f"Group {number}:")
+        for key in group:
+            print(f"  [{key[:8]}] {texts[key]}")
+    print(f"{len(groups)} groups of near-duplicate questions.")
+
+@click.command(name='import')
+@click.argument('paths', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+def import_(paths):
+    from export import load_questions
+    from question_bank import BANK_FILE, QuestionBank
+
+    with QuestionBank(BANK_FILE) as question_bank:
+        for path in paths:
+            questions_list = list(load_questions(path))
+            added = question_bank.add(questions_list)
+            print(f"{path}: {added} new of {len(questions_list)}")
+
+def check_export_path(path, param_hint):
+    if path.rsplit('.', 1)[-1] not in EXPORT_FORMATS:
+        raise click.BadParameter(f"extension must be one of {', '.join(EXPORT_FORMATS)}", param_hint=param_hint)
+
+@click.command()
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.argument('destination', type=click.Path(dir_okay=False))
+def convert(source, destination):
+    # Converts between capture logs, exports and binary corpora by extension.
+    from export import load_questions
+    from render import write_rendered
+
+    check_export_path(destination, 'DESTINATION')
+    questions_list = list(load_questions(source))
+    write_rendered(destination, questions_list)
+    print(f"Converted {len(questions_list)} questions to {destination}")
+
+@click.command()
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('-o', '--output', 'destination', required=True, type=click.Path(dir_okay=False),
+              help='Merged file, its extension picks the format')
+@click.option('--keep', type=click.Choice(['earliest', 'latest']), default='earliest', show_default=True,
+              help='Which timestamp to keep for questions seen more than once')
+@click.option('-m', '--memory-limit', type=click.IntRange(16), default=256, show_default=True,
+              help='Approximate memory ceiling in MB')
+@click.option('--bank', 'add_to_bank', is_flag=True, help='Also add the merged questions to the question bank')
+def merge(paths, destination, keep, memory_limit, add_to_bank):
+    from merge import UNBOUNDED_FORMATS, merge_exports
+    from question_bank import BANK_FILE, QuestionBank
+
+    check_export_path(destination, '--output')
+    if destination.endswith(UNBOUNDED_FORMATS):
+        raise click.BadParameter("a .ksq corpus keeps all its strings in memory while written, so the memory limit "
+                                 "can't hold; merge to .json and convert the result", param_hint='--output')
+
+    def progress(state, done_bytes):
+        print(f"\rMerging: {done_bytes / 2 ** 20:.0f}/{state.total_bytes / 2 ** 20:.0f} MB, "
+              f"{state.read} questions, {state.unique} unique", end='', flush=True)
+
+    question_bank = QuestionBank(BANK_FILE) if add_to_bank else None
+    try:
+        read, unique = merge_exports(paths, destination, keep, memory_limit * 2 ** 20, progress, question_bank)
+    finally:
+        if question_bank is not None:
+            question_bank.close()
+    print()
+    print(f"Merged {read} questions into {unique} unique in {destination}")
+
+@click.group()
+def images():
+    pass
+
+def fetch_with_progress(urls, image_store, concurrency=None):
+    from images import FETCH_CONCURRENCY, fetch_images
+
+    def progress(done, total):
+        print(f"\rDownloading images: {done}/{total}", end='', flush=True)
+
+    downloaded, failed = fetch_images(urls, image_store, concurrency or FETCH_CONCURRENCY, progress)
+    if downloaded or failed:
+        print()
+    for url, error in failed:
+        print(f"Failed to download {url}: {error}")
+    return downloaded, failed
+
+@click.command()
+@click.argument('paths', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('-j', '--jobs', type=click.IntRange(1, 64), help='Parallel downloads')
+def fetch(paths, jobs):
+    from capture_log import CAPTURE_FILE, iter_records
+    from export import load_questions
+    from images import ImageStore, image_urls
+    from question_bank import BANK_FILE, QuestionBank
 
-    timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
-    output_txt_path = os.path.join('output', f"{timestamp}.txt")
-    output_json_path = os.path.join('output', f"{timestamp}.json")
+    def questions():
+        if not paths:
+            yield from iter_records(CAPTURE_FILE)
+            with QuestionBank(BANK_FILE) as question_bank:
+                yield from question_bank.query()
+        for path in paths:
+            yield from load_questions(path)
 
-    os.makedirs('output', exist_ok=True)
+    image_store = ImageStore()
+    downloaded, failed = fetch_with_progress(image_urls(questions()), image_store, jobs)
+    image_store.close()
+    print(f"Downloaded {len(downloaded)} images, {len(failed)} failed, {len(image_store)} in the archive.")
 
-    questions_text = render_questions_to_text(questions_list)
-    with open(output_txt_path, 'w', encoding='utf-8-sig') as file:
-        file.write(questions_text)
+@click.command(name='stats')
+def image_stats():
+    from images import ImageStore
 
-    with open(output_json_path, 'w', encoding='utf-8-sig') as file:
-        json.dump(questions_list, file, ensure_ascii=False, indent=4)
+    image_store = ImageStore()
+    files = image_store.files()
+    print(f"URLs: {len(image_store)}, files: {len(files)}, size: {sum(files.values()) / 2 ** 20:.1f} MB")
 
-    os.remove('intercepted_data.json')
+images.add_command(fetch)
+images.add_command(image_stats)
 
-    print(f"Data saved to {output_txt_path} and {output_json_path}")
+bank.add_command(count)
+bank.add_command(query)
+bank.add_command(export)
+bank.add_command(import_)
+bank.add_command(duplicates)
 
 cli.add_command(start)
 cli.add_command(stop)
 cli.add_command(save)
+cli.add_command(status)
+cli.add_command(metrics)
+cli.add_command(profile)
+cli.add_command(bank)
+cli.add_command(images)
+cli.add_command(convert)
+cli.add_command(merge)
+cli.add_command(search)
 
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,326 @@
+import mmap
+import struct
+
+# Compact binary corpus (.ksq). Questions are stored as generic JSON values,
+# so any record round-trips exactly, but every string (texts, answer texts,
+# type names, image ids, keys) lives once in a shared string table and is
+# referenced by number. The file is memory-mapped for reading and has offset
+# tables, so a single question is decoded without touching the others.
+#
+#   header | records | record offsets | string offsets | string data | id index
+#
+# Integers are little-endian; inside records they are LEB128 varints.
+
+MAGIC = b'KSQB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQQQQQQ')
+OFFSET = struct.Struct('<Q')
+ID_ENTRY = struct.Struct('<QQ')
+
+NULL, FALSE, TRUE, INT, FLOAT, STR, LIST, DICT, BIGINT = range(9)
+FLOAT_STRUCT = struct.Struct('<d')
+INT64_LIMIT = 1 << 63
+# Strings a reader keeps decoded; past that its cache starts over.
+STRING_CACHE_SIZE = 1 << 16
+# Strings are numbered in order of first use, so reading every record reads
+# a string not seen yet together with the ones after it.
+STRING_READ_AHEAD = 256
+
+class CorpusError(Exception):
+    pass
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, position):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+def question_id(question):
+    value = question.get('id') if isinstance(question, dict) else None
+    return None if value is None else str(value)
+
+class CorpusWriter:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.strings = {}
+        self.record_offsets = []
+        self.ids = []
+        self.position = HEADER.size
+
+    def __enter__(self):
+        self.file = open(self.path, 'wb')
+        self.file.write(b'\0' * HEADER.size)
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.finish()
+        self.file.close()
+
+    def intern(self, value):
+        ref = self.strings.get(value)
+        if ref is None:
+            ref = self.strings[value] = len(self.strings)
+        return ref
+
+    def encode(self, out, value):
+        if value is None:
+            out.append(NULL)
+        elif value is True:
+            out.append(TRUE)
+        elif value is False:
+            out.append(FALSE)
+        elif isinstance(value, str):
+            out.append(STR)
+            write_varint(out, self.intern(value))
+        elif isinstance(value, int):
+            if -INT64_LIMIT <= value < INT64_LIMIT:
+                out.append(INT)
+                write_varint(out, (value << 1) ^ (value >> 63))
+            else:
+                out.append(BIGINT)
+                write_varint(out, self.intern(str(value)))
+        elif isinstance(value, float):
+            out.append(FLOAT)
+            out += FLOAT_STRUCT.pack(value)
+        elif isinstance(value, (list, tuple)):
+            out.append(LIST)
+            write_varint(out, len(value))
+            for item in value:
+                self.encode(out, item)
+        elif isinstance(value, dict):
+            out.append(DICT)
+            write_varint(out, len(value))
+            for key, item in value.items():
+                write_varint(out, self.intern(str(key)))
+                self.encode(out, item)
+        else:
+            raise CorpusError(f"Cannot store {type(value).__name__} in a corpus")
+
+    def add(self, question):
+        out = bytearray()
+        self.encode(out, question)
+        identifier = question_id(question)
+        if identifier is not None:
+            self.ids.append((self.intern(identifier), len(self.record_offsets)))
+        self.record_offsets.append(self.position)
+        self.file.write(out)
+        self.position += len(out)
+
+    def finish(self):
+        self.record_offsets.append(self.position)
+        records_offsets_pos = self.position
+        self.file.write(b''.join(OFFSET.pack(offset) for offset in self.record_offsets))
+
+        strings = [string.encode('utf-8') for string in self.strings]
+        string_offsets_pos = records_offsets_pos + OFFSET.size * len(self.record_offsets)
+        offset = 0
+        offsets = bytearray()
+        for string in strings:
+            offsets += OFFSET.pack(offset)
+            offset += len(string)
+        offsets += OFFSET.pack(offset)
+        self.file.write(offsets)
+        string_data_pos = string_offsets_pos + len(offsets)
+        self.file.write(b''.join(strings))
+
+        # Sorted by id text so that readers can binary search it.
+        id_index_pos = string_data_pos + offset
+        self.ids.sort(key=lambda entry: strings[entry[0]])
+        self.file.write(b''.join(ID_ENTRY.pack(ref, index) for ref, index in self.ids))
+
+        self.file.seek(0)
+        self.file.write(HEADER.pack(
+            MAGIC, VERSION, 0, len(self.record_offsets) - 1, len(strings),
+            records_offsets_pos, string_offsets_pos, string_data_pos, id_index_pos, len(self.ids),
+        ))
+
+def write_corpus(path, questions):
+    with CorpusWriter(path) as writer:
+        for question in questions:
+            writer.add(question)
+
+class StringTable(dict):
+    # The corpus' strings by number, decoded on first use. Cached ones are
+    # plain dict lookups for decode_value.
+    def __init__(self, corpus, read_ahead=1, limit=STRING_CACHE_SIZE):
+        super().__init__()
+        self.corpus = corpus
+        self.read_ahead = read_ahead
+        self.limit = limit
+        self.read_to = 0
+
+    def __missing__(self, ref):
+        if len(self) >= self.limit:
+            self.clear()
+        if self.read_ahead == 1 or ref < self.read_to:
+            value = self[ref] = self.corpus.read_string(ref)
+            return value
+        self.read_to = min(ref + self.read_ahead, self.corpus.string_count)
+        self.update(zip(range(ref, self.read_to), self.corpus.read_strings(ref, self.read_to)))
+        return dict.__getitem__(self, ref)
+
+def decode_value(data, position, strings):
+    # Decodes the value at `position` of a bytes object or map, returns it with the
+    # position after it. Single byte varints and string references, by far
+    # the most common, are read inline.
+    tag = data[position]
+    position += 1
+    if tag == STR:
+        ref = data[position]
+        if ref < 0x80:
+            return strings[ref], position + 1
+        ref, position = read_varint(data, position)
+        return strings[ref], position
+    if tag == DICT:
+        length = data[position]
+        if length < 0x80:
+            position += 1
+        else:
+            length, position = read_varint(data, position)
+        value = {}
+        for _ in range(length):
+            ref = data[position]
+            if ref < 0x80:
+                position += 1
+            else:
+                ref, position = read_varint(data, position)
+            if data[position] == STR and data[position + 1] < 0x80:
+                value[strings[ref]] = strings[data[position + 1]]
+                position += 2
+            else:
+                value[strings[ref]], position = decode_value(data, position, strings)
+        return value, position
+    if tag == LIST:
+        length = data[position]
+        if length < 0x80:
+            position += 1
+        else:
+            length, position = read_varint(data, position)
+        value = []
+        for _ in range(length):
+            if data[position] == STR and data[position + 1] < 0x80:
+                value.append(strings[data[position + 1]])
+                position += 2
+            else:
+                item, position = decode_value(data, position, strings)
+                value.append(item)
+        return value, position
+    if tag == INT:
+        raw, position = read_varint(data, position)
+        return (raw >> 1) ^ -(raw & 1), position
+    if tag == NULL:
+        return None, position
+    if tag == TRUE:
+        return True, position
+    if tag == FALSE:
+        return False, position
+    if tag == FLOAT:
+        return FLOAT_STRUCT.unpack_from(data, position)[0], position + FLOAT_STRUCT.size
+    if tag == BIGINT:
+        ref, position = read_varint(data, position)
+        return int(strings[ref]), position
+    raise CorpusError(f"Unknown value tag {tag} at {position - 1}")
+
+class Corpus:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise CorpusError(f"{path} is empty")
+
+        if len(self.data) < HEADER.size:
+            self.close()
+            raise CorpusError(f"{path} is not a question corpus")
+        (magic, version, _, self.record_count, self.string_count, self.records_offsets_pos,
+         self.string_offsets_pos, self.string_data_pos, self.id_index_pos, self.id_count) = \
+            HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise CorpusError(f"{path} is not a version {VERSION} question corpus")
+        self.string_cache = StringTable(self)
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.record_count
+
+    def string(self, ref):
+        return self.string_cache[ref]
+
+    def read_string(self, ref):
+        start, end = struct.unpack_from('<QQ', self.data, self.string_offsets_pos + ref * OFFSET.size)
+        position = self.string_data_pos + start
+        return str(self.data[position:position + end - start], 'utf-8')
+
+    def read_strings(self, start, stop):
+        offsets = struct.unpack_from(f'<{stop - start + 1}Q', self.data, self.string_offsets_pos + start * OFFSET.size)
+        blob = self.data[self.string_data_pos + offsets[0]:self.string_data_pos + offsets[-1]]
+        first = offsets[0]
+        return [str(blob[begin - first:end - first], 'utf-8') for begin, end in zip(offsets, offsets[1:])]
+
+    def record_offsets(self, start, stop):
+        return struct.unpack_from(f'<{stop - start + 1}Q', self.data, self.records_offsets_pos + start * OFFSET.size)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.record_count
+        if not 0 <= index < self.record_count:
+            raise IndexError(index)
+        start, end = self.record_offsets(index, index + 1)
+        return decode_value(self.data[start:end], 0, self.string_cache)[0]
+
+    def __iter__(self):
+        # Records follow each other, so they are decoded straight from the map
+        # one after another: only the cached strings and the current question
+        # are held, however large the corpus.
+        strings = StringTable(self, STRING_READ_AHEAD)
+        position = HEADER.size
+        for _ in range(self.record_count):
+            question, position = decode_value(self.data, position, strings)
+            yield question
+
+    def get(self, identifier, default=None):
+        # Binary search over the id index, decoding only the probed ids.
+        identifier = str(identifier)
+        low, high = 0, self.id_count
+        while low < high:
+            middle = (low + high) // 2
+            ref, index = ID_ENTRY.unpack_from(self.data, self.id_index_pos + middle * ID_ENTRY.size)
+            value = self.string(ref)
+            if value < identifier:
+                low = middle + 1
+            elif value > identifier:
+                high = middle
+            else:
+                return self[index]
+        return default
+
+def read_corpus(path):
+    with Corpus(path) as corpus:
+        yield from corpus
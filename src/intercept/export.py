@@ -0,0 +1,140 @@
+import codecs
+import json
+import os
+import re
+import tempfile
+from datetime import datetime
+from capture_log import CAPTURE_FILE, discard, iter_records, segment_paths
+from identity import question_digest
+from render import DEFAULT_FORMATS, write_rendered
+
+OUTPUT_DIR = 'output'
+# Memory a save may use. Deduplicating in memory holds the parsed questions,
+# which take up to this many times the log's size (2.7x to 3.7x measured,
+# depending on how many are duplicates); logs that would need more go through
+# the on-disk index that merge uses.
+SAVE_MEMORY_LIMIT = 256 * 2 ** 20
+PARSED_EXPANSION = 4
+JSON_CHUNK_SIZE = 1 << 20
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+JSON_ITEM_END = frozenset(' \t\r\n,]')
+
+def iter_json_array(file, chunk_size=JSON_CHUNK_SIZE):
+    # Yields the items of a top-level JSON array from a binary file, holding
+    # about one chunk and one item in memory instead of the whole document.
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError(f"Expected a JSON array at character {position}")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                # A number cut off by the chunk boundary still decodes, so the
+                # item only counts once something that ends it follows.
+                if eof or (end < len(buffer) and buffer[end] in JSON_ITEM_END):
+                    yield item
+                    position = end
+                    continue
+        elif eof:
+            raise ValueError("Unexpected end of JSON array")
+
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + text_decoder.decode(chunk, final=eof)
+        position = 0
+
+def load_questions(path):
+    # Questions from a capture log (.jsonl), a binary corpus (.ksq) or a JSON
+    # export.
+    path = str(path)
+    if path.endswith('.jsonl'):
+        yield from iter_records(path)
+    elif path.endswith('.ksq'):
+        from corpus import read_corpus
+        yield from read_corpus(path)
+    else:
+        with open(path, 'rb') as file:
+            yield from iter_json_array(file)
+
+def deduplicate_questions(questions_list):
+    seen = {}
+    deduplicated_list = []
+
+    for question in questions_list:
+        key = question_digest(question)
+        if key not in seen:
+            seen[key] = True
+            deduplicated_list.append(question)
+
+    return deduplicated_list
+
+def offline_images(questions_list, image_store, output_dir):
+    from images import fetch_images, image_urls
+
+    fetch_images(image_urls(questions_list), image_store)
+    return image_store.linker(output_dir)
+
+def save_captures(formats=DEFAULT_FORMATS, capture_file=CAPTURE_FILE, output_dir=OUTPUT_DIR, image_store=None,
+                  memory_limit=SAVE_MEMORY_LIMIT, segments=None):
+    # Renders the deduplicated capture log, segments included, into output_dir
+    # and clears the log; given segments, only those files of it are saved and
+    # removed. With an image_store, missing images are downloaded first and
+    # exports link to the local copies. Returns the written paths, empty when
+    # there was nothing to save.
+    if segments is None:
+        segments = [segment for segment in segment_paths(capture_file) if os.path.exists(segment)]
+    size = sum(map(os.path.getsize, segments))
+    if not size:
+        return []
+
+    if size * PARSED_EXPANSION <= memory_limit:
+        questions_list = deduplicate_questions(iter_records(capture_file, segments))
+        output_paths = write_questions(lambda: questions_list, len(questions_list), formats, output_dir, image_store)
+    else:
+        from merge import Merger
+
+        os.makedirs(output_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix='.save-', dir=output_dir) as work_directory:
+            merger = Merger(work_directory, memory_limit)
+            try:
+                unique = merger.add(segments).unique
+                output_paths = write_questions(merger.questions, unique, formats, output_dir, image_store)
+            finally:
+                merger.close()
+
+    if output_paths:
+        discard(capture_file, segments)
+    return output_paths
+
+def write_questions(questions, count, formats, output_dir, image_store):
+    # questions() yields the questions afresh for every pass over them.
+    if not count:
+        return []
+
+    timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
+    os.makedirs(output_dir, exist_ok=True)
+    image_url = offline_images(questions(), image_store, output_dir) if image_store else None
+
+    output_paths = []
+    for output_format in formats:
+        output_path = os.path.join(output_dir, f"{timestamp}.{output_format}")
+        write_rendered(output_path, questions(), output_format, image_url)
+        output_paths.append(output_path)
+    return output_paths
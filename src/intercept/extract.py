@@ -0,0 +1,90 @@
+import html
+import re
+
+QUESTIONS_ATTR = 'v-bind:questions'
+QUESTION_TYPES_ATTR = 'v-bind:question-types'
+
+TAG_START_RE = re.compile(rb'<questions[\s/>]', re.IGNORECASE)
+ATTR_RE = re.compile(rb'''\s*([^\s"'=<>/]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?''')
+TAG_END_RE = re.compile(rb'\s*/?>')
+CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+WANTED_ATTRS = {QUESTIONS_ATTR.encode(), QUESTION_TYPES_ATTR.encode()}
+
+# Entities the server actually emits inside attribute values; `&amp;` goes last
+# so that an escaped entity isn't unescaped twice.
+SIMPLE_ENTITIES = (
+    ('&quot;', '"'), ('&#34;', '"'), ('&#39;', "'"), ('&#039;', "'"), ('&apos;', "'"),
+    ('&lt;', '<'), ('&gt;', '>'), ('&amp;', '&'),
+)
+
+def content_charset(content_type, default='utf-8'):
+    match = CHARSET_RE.search(content_type or '')
+    return match.group(1) if match else default
+
+def extract_questions_attrs(content, encoding='utf-8'):
+    # Returns {'v-bind:questions': ..., 'v-bind:question-types': ...} or None.
+    attrs = scan_questions_tag(content, encoding)
+    if attrs is None:
+        attrs = soup_questions_tag(content.decode(encoding, errors='replace'))
+    return attrs
+
+def scan_questions_tag(content, encoding='utf-8'):
+    # Fast path: look at the raw bytes of the <questions> start tag only and
+    # decode just the two attributes we need.
+    match = TAG_START_RE.search(content)
+    if match is None:
+        return None
+
+    position = match.start() + len(b'<questions')
+    found = {}
+    while True:
+        end = TAG_END_RE.match(content, position)
+        if end is not None:
+            break
+        attr = ATTR_RE.match(content, position)
+        if attr is None or attr.end() == position:
+            return None
+        position = attr.end()
+
+        name = attr.group(1).lower()
+        if name in WANTED_ATTRS and name not in found:
+            value = attr.group(2)
+            if value is None:
+                value = attr.group(3)
+            if value is None:
+                value = attr.group(4) or b''
+            try:
+                found[name] = unescape(value.decode(encoding))
+            except (LookupError, UnicodeDecodeError):
+                return None
+
+    if len(found) != len(WANTED_ATTRS):
+        return None
+    return {name.decode(): value for name, value in found.items()}
+
+def unescape(value):
+    total = value.count('&')
+    if total == 0:
+        return value
+    if sum(value.count(entity) for entity, _ in SIMPLE_ENTITIES) != total:
+        return html.unescape(value)
+    for entity, char in SIMPLE_ENTITIES:
+        value = value.replace(entity, char)
+    return value
+
+def soup_questions_tag(text):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(text, 'html.parser')
+    questions_tag = soup.find('questions')
+    if questions_tag is None:
+        return None
+
+    try:
+        return {
+            QUESTIONS_ATTR: questions_tag[QUESTIONS_ATTR],
+            QUESTION_TYPES_ATTR: questions_tag[QUESTION_TYPES_ATTR],
+        }
+    except KeyError:
+        return None
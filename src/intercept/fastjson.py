@@ -0,0 +1,27 @@
+import codecs
+import json
+
+# orjson when it is installed, the standard library otherwise. Both produce
+# the same values; orjson writes compact JSON without spaces.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads(data):
+    # Accepts str or UTF-8 bytes, with or without a BOM.
+    if isinstance(data, bytes) and data.startswith(codecs.BOM_UTF8):
+        data = data[len(codecs.BOM_UTF8):]
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps_line(record):
+    # One JSON document as UTF-8 bytes with a trailing newline.
+    if orjson is not None:
+        try:
+            return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            # Integers beyond 64 bits and the like; json copes with them.
+            pass
+    return json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
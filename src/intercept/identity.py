@@ -0,0 +1,157 @@
+import hashlib
+import html
+import re
+import struct
+import unicodedata
+from collections import OrderedDict, defaultdict
+from itertools import islice
+
+TAG_RE = re.compile(r'<[^>]*>')
+WHITESPACE_RE = re.compile(r'\s+')
+WORD_RE = re.compile(r'\w+')
+# Groups of an LSH bucket each question is compared with, newest first.
+GROUP_WINDOW = 16
+
+def canonical_text(text):
+    # Collapses everything that doesn't change what a question says: markup,
+    # HTML entities, unicode forms, case, "ё" spelling and whitespace.
+    text = html.unescape(TAG_RE.sub(' ', text or ''))
+    text = unicodedata.normalize('NFKC', text).casefold().replace('ё', 'е')
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+def canonical_answers(answers):
+    # Answer order and uids are reissued by the server, only content counts.
+    return sorted(
+        canonical_text(answer.get('answer')) + '\x1f' + '\x1f'.join(sorted(answer.get('images') or ()))
+        for answer in answers or ()
+    )
+
+def canonical_question(question):
+    parts = [
+        str(question.get('type') or ''),
+        canonical_text(question.get('text')),
+        '\x1f'.join(sorted(question.get('images') or ())),
+        '\x1d'.join(canonical_answers(question.get('answers'))),
+        '\x1d'.join(canonical_answers(question.get('answers_draggable'))),
+    ]
+    return '\x1e'.join(parts)
+
+def question_digest(question):
+    return hashlib.blake2b(canonical_question(question).encode('utf-8'), digest_size=16).hexdigest()
+
+def word_shingles(text, size=3):
+    words = WORD_RE.findall(canonical_text(text))
+    if len(words) < size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def shingles(question, size=3):
+    # Answers are shingled one by one so that their order doesn't matter.
+    tokens = word_shingles(question.get('text'), size)
+    for answer in question.get('answers') or ():
+        tokens |= word_shingles(answer.get('answer'), size)
+    return tokens
+
+class MinHasher:
+    # Each 64-byte BLAKE2 digest of a shingle yields 16 independent 32-bit hash
+    # values, so a signature is an element-wise min computed mostly in C.
+    def __init__(self, num_perm=64, seed=1):
+        if num_perm % 16:
+            raise ValueError("num_perm must be a multiple of 16")
+        self.num_perm = num_perm
+        self.salts = [struct.pack('<II', seed, i) for i in range(num_perm // 16)]
+        self.unpack = struct.Struct(f'<{num_perm}I').unpack
+
+    def hash_token(self, token):
+        data = token.encode('utf-8')
+        return self.unpack(b''.join(hashlib.blake2b(data, salt=salt).digest() for salt in self.salts))
+
+    def signature(self, tokens):
+        rows = [self.hash_token(token) for token in tokens] or [self.hash_token('')]
+        return tuple(map(min, zip(*rows)))
+
+def similarity(left, right):
+    return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+class NearDuplicateIndex:
+    # MinHash signatures split into bands; only questions that collide in at
+    # least one band are compared, so grouping a corpus is roughly linear in
+    # its size instead of pairwise.
+    def __init__(self, threshold=0.8, num_perm=64, bands=16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self.signatures = {}
+        self.buckets = defaultdict(list)
+
+    def band_keys(self, signature):
+        rows = self.rows
+        for band in range(self.bands):
+            yield band, signature[band * rows:(band + 1) * rows]
+
+    def add(self, key, question):
+        signature = self.hasher.signature(shingles(question))
+        self.signatures[key] = signature
+        for band_key in self.band_keys(signature):
+            self.buckets[band_key].append(key)
+        return signature
+
+    def candidates(self, key):
+        found = set()
+        for band_key in self.band_keys(self.signatures[key]):
+            found.update(self.buckets[band_key])
+        found.discard(key)
+        return found
+
+    def similar(self, question):
+        signature = self.hasher.signature(shingles(question))
+        found = set()
+        for band_key in self.band_keys(signature):
+            found.update(self.buckets[band_key])
+        scored = ((similarity(signature, self.signatures[key]), key) for key in found)
+        return sorted((item for item in scored if item[0] >= self.threshold), reverse=True)
+
+    def groups(self):
+        parent = {}
+
+        def find(key):
+            root = key
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while key != root:
+                parent[key], key = root, parent.get(key, key)
+            return root
+
+        # Pairs already compared in another bucket aren't compared again.
+        compared = set()
+        for keys in self.buckets.values():
+            if len(keys) < 2:
+                continue
+            # Each key is compared with the newest key of the groups most
+            # recently seen in the bucket, so a cluster of similar questions
+            # costs a comparison or two a key, and a key similar to two groups
+            # joins them. A growing group stays recent; questions similar to
+            # nothing drop out of the window instead of being compared with
+            # every later key.
+            representatives = OrderedDict()
+            for key in keys:
+                for root, other in list(islice(reversed(representatives.items()), GROUP_WINDOW)):
+                    if find(key) == find(root) or (other, key) in compared:
+                        continue
+                    compared.add((other, key))
+                    if similarity(self.signatures[other], self.signatures[key]) >= self.threshold:
+                        parent[find(key)] = find(root)
+                root = find(key)
+                representatives.pop(root, None)
+                representatives[root] = key
+
+        groups = defaultdict(list)
+        for key in parent:
+            groups[find(key)].append(key)
+        for root, members in groups.items():
+            if root not in members:
+                members.append(root)
+        return [sorted(members) for members in groups.values() if len(members) > 1]
@@ -0,0 +1,177 @@
+import hashlib
+import mimetypes
+import os
+import threading
+from urllib.parse import urlsplit
+from capture_log import CaptureLog, iter_records
+from render import ANSWER_IMAGE_BASE_URL, QUESTION_IMAGE_BASE_URL
+
+IMAGES_DIR = 'images'
+INDEX_FILE = 'index.jsonl'
+FETCH_CONCURRENCY = 8
+FETCH_TIMEOUT = 30
+
+def image_urls(questions, question_base_url=QUESTION_IMAGE_BASE_URL, answer_base_url=ANSWER_IMAGE_BASE_URL):
+    seen = set()
+    for question in questions:
+        urls = [question_base_url + image for image in question.get('images') or ()]
+        for key in ('answers', 'answers_draggable'):
+            for answer in question.get(key) or ():
+                urls.extend(answer_base_url + image for image in answer.get('images') or ())
+        for url in urls:
+            if url not in seen:
+                seen.add(url)
+                yield url
+
+class ImageStore:
+    # Images are stored once under their BLAKE2 digest; index.jsonl maps every
+    # URL seen to the digest, so the same picture behind many URLs costs one
+    # file and a URL is never downloaded twice.
+    def __init__(self, directory=IMAGES_DIR):
+        self.directory = directory
+        # Every archived URL, loaded whole: it grows with distinct images,
+        # not with captures.
+        self.index = None
+        self.index_log = CaptureLog(os.path.join(directory, INDEX_FILE))
+        self.lock = threading.Lock()
+
+    def load(self):
+        if self.index is None:
+            self.index = {}
+            for entry in iter_records(self.index_log.path):
+                self.index[entry['url']] = entry
+        return self
+
+    def close(self):
+        with self.lock:
+            self.index_log.close()
+
+    def __contains__(self, url):
+        self.load()
+        return url in self.index
+
+    def __len__(self):
+        self.load()
+        return len(self.index)
+
+    def path(self, entry):
+        return os.path.join(self.directory, entry['path'])
+
+    def local_path(self, url):
+        self.load()
+        entry = self.index.get(url)
+        return self.path(entry) if entry else None
+
+    def linker(self, relative_to):
+        # image_url callback for the renderers: archived images become paths
+        # relative to the export, missing ones keep their remote URL.
+        def image_url(url):
+            path = self.local_path(url)
+            return os.path.relpath(path, relative_to).replace(os.sep, '/') if path else url
+        return image_url
+
+    def add(self, url, content, content_type=None):
+        self.load()
+        if url in self.index:
+            return self.index[url]
+
+        digest = hashlib.blake2b(content, digest_size=20).hexdigest()
+        extension = os.path.splitext(urlsplit(url).path)[1].lower()
+        if not extension and content_type:
+            extension = mimetypes.guess_extension(content_type.split(';')[0].strip()) or ''
+        relative_path = os.path.join(digest[:2], digest + extension)
+        full_path = os.path.join(self.directory, relative_path)
+
+        with self.lock:
+            if url in self.index:
+                return self.index[url]
+            if not os.path.exists(full_path):
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                temporary_path = f"{full_path}.{threading.get_ident()}.part"
+                with open(temporary_path, 'wb') as file:
+                    file.write(content)
+                os.replace(temporary_path, full_path)
+            entry = {'url': url, 'digest': digest, 'path': relative_path, 'size': len(content)}
+            self.index_log.append([entry])
+            self.index[url] = entry
+        return entry
+
+    def files(self):
+        # Stored files by digest, with their size in bytes.
+        self.load()
+        return {entry['digest']: entry['size'] for entry in self.index.values()}
+
+class ConnectionPool:
+    # One keep-alive connection per host and worker thread. http.client is
+    # imported on use, since the addon only ever stores images.
+    def __init__(self, timeout=FETCH_TIMEOUT):
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self, scheme, netloc):
+        import http.client
+
+        connections = self.local.__dict__.setdefault('connections', {})
+        key = (scheme, netloc)
+        if key not in connections:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connections[key] = connection_class(netloc, timeout=self.timeout)
+        return connections[key]
+
+    def drop(self, scheme, netloc):
+        connection = self.local.__dict__.get('connections', {}).pop((scheme, netloc), None)
+        if connection is not None:
+            connection.close()
+
+    def get(self, url):
+        import http.client
+
+        parts = urlsplit(url)
+        target = parts.path + (f"?{parts.query}" if parts.query else '')
+        for attempt in range(2):
+            connection = self.connection(parts.scheme, parts.netloc)
+            try:
+                connection.request('GET', target, headers={'Connection': 'keep-alive'})
+                response = connection.getresponse()
+                content = response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection, retry once
+                # on a fresh one.
+                self.drop(parts.scheme, parts.netloc)
+                if attempt:
+                    raise
+                continue
+            if response.will_close:
+                self.drop(parts.scheme, parts.netloc)
+            return response.status, response.getheader('content-type'), content
+
+def fetch_images(urls, store, concurrency=FETCH_CONCURRENCY, progress=None):
+    # Downloads the URLs missing from the store with at most `concurrency`
+    # requests in flight. Returns (downloaded, failed) URL lists.
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    pending = [url for url in dict.fromkeys(urls) if url not in store]
+    pool = ConnectionPool()
+    downloaded = []
+    failed = []
+
+    def fetch(url):
+        status, content_type, content = pool.get(url)
+        if status != 200:
+            raise OSError(f"HTTP {status}")
+        store.add(url, content, content_type)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='image-fetch') as executor:
+        futures = {executor.submit(fetch, url): url for url in pending}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failed.append((url, str(e)))
+            else:
+                downloaded.append(url)
+            if progress is not None:
+                progress(len(downloaded) + len(failed), len(pending))
+
+    return downloaded, failed
@@ -1,76 +1,331 @@
-from mitmproxy import http
-from bs4 import BeautifulSoup
-import json
+from mitmproxy import ctx, http
+import asyncio
 import os
+import threading
+import typing
 from datetime import datetime
+import fastjson
+from capture_log import QUARANTINE_FILE, CaptureLog
+from export import DEFAULT_FORMATS, OUTPUT_DIR
+from extract import QUESTIONS_ATTR, QUESTION_TYPES_ATTR, content_charset, extract_questions_attrs
+from images import IMAGES_DIR, ImageStore
+from ipc import IpcServer, default_address
+from metrics import Counter, MetricsServer, Profiler, StageTimer, exposition
+from model import InvalidQuestion, decode_questions, type_table
+from question_bank import BANK_FILE, QuestionBank
+from render import render_questions_to_text
+from routes import (DEFAULT_CAPTURE_ROUTES, DEFAULT_IMAGE_ROUTES, IMAGES_ROUTE, QUESTIONS_ROUTE, SERVICE_HOSTS,
+    RouteTable, host_patterns)
+from sessions import SESSION_MODES, SessionTable, save_sessions, session_name
+from worker import CaptureWorker
 
-questions_list = []
+PROFILE_DIR = 'profiles'
 
-def response(flow: http.HTTPFlow) -> None:
-    if flow.request.pretty_url == "https://ks2.rsmu.ru/tests2/questions":
-        response_text = flow.response.text
+# Capture logs, one per session; each has its own lock.
+sessions = SessionTable()
+quarantine_log = CaptureLog(QUARANTINE_FILE)
+quarantine_lock = threading.Lock()
+question_bank = QuestionBank()
+image_store = ImageStore()
+ipc_server = IpcServer()
+counters = {
+    'captures': Counter('intercept_captures_total', 'Question pages captured'),
+    'questions': Counter('intercept_questions_total', 'Questions captured'),
+    'new_questions': Counter('intercept_new_questions_total', 'Questions new to the question bank'),
+    'duplicates': Counter('intercept_duplicate_questions_total', 'Questions already in the question bank'),
+    'errors': Counter('intercept_capture_errors_total', 'Captures that failed to process'),
+    'quarantined': Counter('intercept_quarantined_total', 'Malformed question records set aside'),
+}
+stage_timer = StageTimer('intercept_stage_seconds', 'Time spent in each stage of a capture',
+                         ('decode', 'extract', 'json', 'types', 'persist'))
+profiler = Profiler()
+metrics_server = None
+stats_task = None
+event_loop = None
+intercept_dir = '.'
+route_table = RouteTable()
+session_mode = 'none'
+session_key = ''
 
-        soup = BeautifulSoup(response_text, 'html.parser')
-        questions_tag = soup.find('questions')
+def process_capture(content, encoding, received, session):
+    try:
+        if profiler.enabled:
+            profiler.call(capture_questions, content, encoding, received, session)
+        else:
+            capture_questions(content, encoding, received, session)
+    except Exception:
+        counters['errors'].inc()
+        raise
 
-        questions_data = questions_tag['v-bind:questions']
-        questions_type = {v: k for k, v in json.loads(questions_tag['v-bind:question-types']).items()}
+def capture_questions(content, encoding, received, session):
+    with stage_timer.time('extract'):
+        questions_tag = extract_questions_attrs(content, encoding)
+    if questions_tag is None:
+        print("No questions found in response.")
+        return
 
-        new_questions_list = json.loads(questions_data)
-        for question in new_questions_list:
-            question['type'] = questions_type[question['type']][14:]
-            question['timestamp'] = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
+    timestamp = received.strftime("%d-%m-%Y_%H-%M-%S")
+    try:
+        with stage_timer.time('json'):
+            raw_questions = fastjson.loads(questions_tag[QUESTIONS_ATTR])
+            types = type_table(questions_tag[QUESTION_TYPES_ATTR])
+    except InvalidQuestion as e:
+        quarantine([(questions_tag, str(e))], timestamp)
+        return
+    except ValueError as e:
+        quarantine([(questions_tag, f"invalid JSON: {e}")], timestamp)
+        return
 
-        global questions_list
-        questions_list.extend(new_questions_list)
+    with stage_timer.time('types'):
+        questions, rejected = decode_questions(raw_questions, types, timestamp)
+        new_questions_list = [question.as_dict() for question in questions]
+    quarantine(rejected, timestamp)
 
-        with open('intercepted_data.json', 'w', encoding='utf-8-sig') as file:
-            json.dump(questions_list, file, ensure_ascii=False, indent=4)
+    with stage_timer.time('persist'):
+        partition = sessions.append(session, new_questions_list)
+        added = question_bank.add(new_questions_list)
 
-        print("Received request and processed data.")
+    partition.count(len(new_questions_list), added)
+    counters['captures'].inc()
+    counters['questions'].inc(len(new_questions_list))
+    counters['new_questions'].inc(added)
+    counters['duplicates'].inc(len(new_questions_list) - added)
+    ipc_server.publish('capture', session=session, timestamp=timestamp, questions=len(new_questions_list),
+                       added=added)
 
-def render_questions_to_text(questions):
-    lines = []
-    question_image_base_url = 'https://ks.rsmu.ru/upload/l_btz_filequestion/'
-    answer_image_base_url = 'https://ks.rsmu.ru/upload/l_btz_fileanswer/'
+    print(f"Received request and processed data for session {session} ({added} new in question bank).")
 
-    for question in questions:
-        question_type = question['type']
-        if question['images']:
-            lines.append(f"{question_type} {question['text']}")
-            for i, image in enumerate(question['images'], start=1):
-                lines.append(f"КАРТИНКА ВОПРОСА {i}: {question_image_base_url}{image}")
-        else:
-            lines.append(f"{question_type} {question['text']}")
-        
-        if question_type == 'MATCHING':
-            try:
-                answers = question['answers']
-                answers_draggable = question['answers_draggable']
-            except KeyError:
-                print(f"Error in question: {question}")
-                continue
-
-            for answer in answers:
-                answer_text = answer['answer']
-                image_ids = ', '.join(answer['images']) if answer['images'] else ''
-                lines.append(f"{answer_text} ({answer_image_base_url}{image_ids})" if image_ids else answer_text)
-            
-            max_answer_length = max(
-                max((len(x['answer']) for x in answers), default=0),
-                max((len(x['answer']) for x in answers_draggable), default=0)
-            )
-            lines.append('-' * max_answer_length)
-
-            for answer in answers_draggable:
-                answer_text = answer['answer']
-                image_ids = ', '.join(answer['images']) if answer['images'] else ''
-                lines.append(f"{answer_text} ({answer_image_base_url}{image_ids})" if image_ids else answer_text)
+def quarantine(rejected, timestamp):
+    if not rejected:
+        return
+    with quarantine_lock:
+        quarantine_log.append([{'reason': reason, 'timestamp': timestamp, 'record': raw} for raw, reason in rejected])
+    counters['quarantined'].inc(len(rejected))
+    print(f"Set aside {len(rejected)} malformed records in {quarantine_log.path}.")
+
+capture_worker = CaptureWorker(process_capture)
+
+def store_image(url, content, content_type):
+    image_store.add(url, content, content_type)
+
+image_worker = CaptureWorker(store_image, maxsize=256, name='image-worker')
+
+def responseheaders(flow: http.HTTPFlow) -> None:
+    # Responses we don't capture are streamed to the browser instead of being
+    # buffered by the proxy.
+    if route_table.match(flow.request.host, flow.request.path) is None:
+        flow.response.stream = True
+
+async def response(flow: http.HTTPFlow) -> None:
+    route = route_table.match(flow.request.host, flow.request.path)
+    if route == QUESTIONS_ROUTE:
+        encoding = content_charset(flow.response.headers.get('content-type'))
+        # Reading .content undoes the Content-Encoding (gzip, br, ...).
+        with stage_timer.time('decode'):
+            content = flow.response.content
+        await capture_worker.submit_async(content, encoding, datetime.now(),
+                                          session_name(flow, session_mode, session_key))
+    elif route == IMAGES_ROUTE and flow.response.status_code == 200:
+        await image_worker.submit_async(
+            flow.request.pretty_url, flow.response.content, flow.response.headers.get('content-type'))
+
+def status_command():
+    stats = {name: counter.value for name, counter in counters.items()}
+    return {**stats, 'pending': capture_worker.jobs.qsize(), 'pid': os.getpid(), 'sessions': sessions.stats()}
+
+def render_metrics():
+    return exposition(*counters.values(), stage_timer)
+
+def metrics_command():
+    return {'text': render_metrics()}
+
+def profile_command():
+    if not profiler.enabled:
+        raise RuntimeError("profiling is off, start the proxy with --set capture_profile=true")
+    return {'paths': profiler.dump(os.path.join(intercept_dir, PROFILE_DIR))}
+
+def stats_line():
+    stats = status_command()
+    line = (f"captures={stats['captures']} questions={stats['questions']} new={stats['new_questions']} "
+            f"duplicates={stats['duplicates']} errors={stats['errors']} pending={stats['pending']}")
+    summary = stage_timer.summary()
+    return f"{line}; {summary}" if summary else line
+
+async def print_stats(interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(stats_line())
+
+def flush_command():
+    capture_worker.join()
+    sessions.sync()
+    return status_command()
+
+def save_command(formats=DEFAULT_FORMATS, offline=False, session=None):
+    # Saves every session, or only the one named.
+    capture_worker.join()
+    image_worker.join()
+    paths = save_sessions(sessions, formats, os.path.join(intercept_dir, OUTPUT_DIR),
+                          image_store if offline else None, session, ctx.options.save_memory * 2 ** 20)
+    ipc_server.publish('saved', paths=paths, session=session)
+    return {'paths': paths}
+
+def stop_command():
+    flush_command()
+    event_loop.call_soon_threadsafe(ctx.master.shutdown)
+    return {}
+
+def load(loader):
+    loader.add_option(
+        name='intercept_dir',
+        typespec=str,
+        default='.',
+        help='Directory for the capture log, question bank, IPC socket and output',
+    )
+    loader.add_option(
+        name='capture_routes',
+        typespec=typing.Sequence[str],
+        default=list(DEFAULT_CAPTURE_ROUTES),
+        help='Question pages to capture, as "host/path"',
+    )
+    loader.add_option(
+        name='capture_images',
+        typespec=bool,
+        default=True,
+        help='Archive question and answer images as they pass through the proxy',
+    )
+    loader.add_option(
+        name='intercept_only_targets',
+        typespec=bool,
+        default=True,
+        help='Pass traffic to other hosts through without TLS interception',
+    )
+    loader.add_option(
+        name='session_by',
+        typespec=str,
+        default='none',
+        choices=SESSION_MODES,
+        help='Partition captures by client address, cookie or header, each with its own save and stats',
+    )
+    loader.add_option(
+        name='session_key',
+        typespec=str,
+        default='',
+        help='Cookie or header naming the session, PHPSESSID and X-Intercept-Session when empty',
+    )
+    loader.add_option(
+        name='segment_size',
+        typespec=int,
+        default=64,
+        help='Seal the capture log into a segment once it reaches this many MB, 0 to disable',
+    )
+    loader.add_option(
+        name='segment_interval',
+        typespec=int,
+        default=0,
+        help='Seal the capture log into a segment after this many seconds, 0 to disable',
+    )
+    loader.add_option(
+        name='save_memory',
+        typespec=int,
+        default=256,
+        help='MB of memory a save may use; logs too large to deduplicate in that (about a quarter of it) '
+             'spill to disk',
+    )
+    loader.add_option(
+        name='metrics_port',
+        typespec=int,
+        default=0,
+        help='Serve Prometheus metrics on 127.0.0.1:PORT/metrics, 0 to disable',
+    )
+    loader.add_option(
+        name='stats_interval',
+        typespec=int,
+        default=0,
+        help='Print a stats line every this many seconds, 0 to disable',
+    )
+    loader.add_option(
+        name='capture_profile',
+        typespec=bool,
+        default=False,
+        help='Profile capture processing with cProfile and tracemalloc, dumped by "cli.py profile" and on exit',
+    )
+
+def configure(updated):
+    global intercept_dir, route_table, image_store, session_mode, session_key
+    if 'intercept_dir' in updated:
+        intercept_dir = ctx.options.intercept_dir
+        sessions.reset(intercept_dir)
+        with quarantine_lock:
+            quarantine_log.close()
+            quarantine_log.path = os.path.join(intercept_dir, QUARANTINE_FILE)
+        question_bank.close()
+        question_bank.path = os.path.join(intercept_dir, BANK_FILE)
+        image_worker.join()
+        image_store.close()
+        image_store = ImageStore(os.path.join(intercept_dir, IMAGES_DIR))
+        if ipc_server.server is None:
+            ipc_server.address = default_address(intercept_dir)
+
+    if {'capture_routes', 'capture_images'} & updated:
+        table = RouteTable()
+        for route in ctx.options.capture_routes:
+            table.add(route, QUESTIONS_ROUTE)
+        if ctx.options.capture_images:
+            for route in DEFAULT_IMAGE_ROUTES:
+                table.add(route, IMAGES_ROUTE)
+        route_table = table
+
+    if {'capture_routes', 'capture_images', 'intercept_only_targets'} & updated and ctx.options.intercept_only_targets:
+        if ctx.options.ignore_hosts:
+            # mitmproxy refuses allow_hosts together with ignore_hosts.
+            print("ignore_hosts is set, not restricting interception to target hosts.")
         else:
-            for answer in question['answers']:
-                answer_text = answer['answer']
-                image_ids = ', '.join(answer['images']) if answer['images'] else ''
-                lines.append(f"{answer_text} ({answer_image_base_url}{image_ids})" if image_ids else answer_text)
-        
-        lines.append('')
-    return '\n'.join(lines)
+            ctx.options.update(allow_hosts=host_patterns([*route_table.hosts(), *SERVICE_HOSTS]))
+
+    if {'intercept_dir', 'segment_size', 'segment_interval'} & updated:
+        sessions.set_rotation(ctx.options.segment_size * 2 ** 20, ctx.options.segment_interval)
+
+    if {'session_by', 'session_key'} & updated:
+        session_mode = ctx.options.session_by
+        session_key = ctx.options.session_key
+
+    if 'capture_profile' in updated:
+        if ctx.options.capture_profile:
+            profiler.enable()
+        elif profiler.enabled:
+            profiler.disable()
+
+def running():
+    global event_loop, metrics_server, stats_task
+    event_loop = asyncio.get_running_loop()
+    ipc_server.command('status', status_command)
+    ipc_server.command('flush', flush_command)
+    ipc_server.command('save', save_command)
+    ipc_server.command('stop', stop_command)
+    ipc_server.command('metrics', metrics_command)
+    ipc_server.command('profile', profile_command)
+    ipc_server.start()
+    if ctx.options.metrics_port:
+        metrics_server = MetricsServer(render_metrics, ctx.options.metrics_port)
+        metrics_server.start()
+    if ctx.options.stats_interval > 0:
+        stats_task = event_loop.create_task(print_stats(ctx.options.stats_interval))
+
+def done():
+    global metrics_server, stats_task
+    if stats_task is not None:
+        stats_task.cancel()
+        stats_task = None
+    if metrics_server is not None:
+        metrics_server.close()
+        metrics_server = None
+    ipc_server.close()
+    capture_worker.close()
+    image_worker.close()
+    sessions.close()
+    quarantine_log.close()
+    question_bank.close()
+    image_store.close()
+    if profiler.enabled:
+        profiler.dump(os.path.join(intercept_dir, PROFILE_DIR))
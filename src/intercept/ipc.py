@@ -0,0 +1,225 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+
+# Control and event channel between the running addon and the CLI/GUI. Each
+# message is one JSON object per line. A client either sends commands and
+# reads one reply per command, or sends {"command": "subscribe"} and then
+# receives every event the addon publishes.
+
+SOCKET_FILE = 'intercept.sock'
+TCP_ADDRESS = ('127.0.0.1', 44701)
+CONNECT_TIMEOUT = 1.0
+SEND_TIMEOUT = 1.0
+
+def use_unix_socket():
+    return hasattr(socket, 'AF_UNIX') and os.name != 'nt'
+
+def default_address(directory='.'):
+    if use_unix_socket():
+        return os.path.join(directory, SOCKET_FILE)
+    return TCP_ADDRESS
+
+def encode_message(message):
+    return json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n'
+
+class IpcUnavailable(Exception):
+    pass
+
+class IpcError(Exception):
+    # The proxy was reached but didn't answer, e.g. a save that outlasted the
+    # timeout. It may still be working on the command.
+    pass
+
+class IpcHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+                command = message['command']
+            except (ValueError, KeyError, TypeError):
+                self.reply({'ok': False, 'error': 'malformed message'})
+                continue
+
+            if command == 'subscribe':
+                # From here on the connection only carries events; the handler
+                # waits until a publish fails or the server closes.
+                self.connection.settimeout(SEND_TIMEOUT)
+                self.reply({'ok': True})
+                self.unsubscribed = threading.Event()
+                self.server.ipc.subscribe(self)
+                self.unsubscribed.wait()
+                return
+
+            handler = self.server.ipc.commands.get(command)
+            if handler is None:
+                self.reply({'ok': False, 'error': f"unknown command: {command}"})
+                continue
+            try:
+                result = handler(**message.get('args', {}))
+            except Exception as e:
+                self.reply({'ok': False, 'error': str(e)})
+            else:
+                self.reply({'ok': True, **(result or {})})
+
+    def reply(self, message):
+        try:
+            self.wfile.write(encode_message(message))
+        except OSError:
+            pass
+
+    def send_event(self, message):
+        self.wfile.write(message)
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class IpcServer:
+    def __init__(self, address=None):
+        self.address = address or default_address()
+        self.commands = {}
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def command(self, name, handler):
+        self.commands[name] = handler
+
+    def start(self):
+        if self.server is not None:
+            return
+        if isinstance(self.address, str):
+            remove_stale_socket(self.address)
+            self.server = ThreadingUnixServer(self.address, IpcHandler)
+        else:
+            self.server = ThreadingTCPServer(self.address, IpcHandler)
+        self.server.ipc = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name='ipc-server', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if self.server is None:
+            return
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for subscriber in subscribers:
+            subscriber.unsubscribed.set()
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def subscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+        subscriber.unsubscribed.set()
+
+    def publish(self, event, **data):
+        message = encode_message({'event': event, **data})
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.send_event(message)
+            except OSError:
+                # Slow or gone subscribers are dropped instead of blocking the
+                # capture worker.
+                self.unsubscribe(subscriber)
+
+def remove_stale_socket(path):
+    if not os.path.exists(path):
+        return
+    try:
+        with connect(path):
+            pass
+    except IpcUnavailable:
+        os.remove(path)
+    else:
+        raise OSError(f"Another proxy is already listening on {path}")
+
+def connect(address=None, timeout=CONNECT_TIMEOUT):
+    address = address or default_address()
+    try:
+        if isinstance(address, str):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            sock.connect(address)
+        else:
+            sock = socket.create_connection(address, timeout)
+    except OSError as e:
+        raise IpcUnavailable(f"Proxy is not reachable at {address}: {e}") from e
+    return sock
+
+class IpcClient:
+    def __init__(self, address=None, timeout=CONNECT_TIMEOUT):
+        self.address = address or default_address()
+        self.timeout = timeout
+        self.sock = None
+        self.rfile = None
+
+    def __enter__(self):
+        self.sock = connect(self.address, self.timeout)
+        self.rfile = self.sock.makefile('rb')
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.sock is not None:
+            self.rfile.close()
+            self.sock.close()
+            self.sock = None
+
+    def shutdown(self):
+        # Unblocks a reader waiting in events() from another thread.
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def send(self, command, **args):
+        self.sock.sendall(encode_message({'command': command, 'args': args}))
+
+    def receive(self):
+        line = self.rfile.readline()
+        if not line:
+            raise IpcError("Proxy closed the connection")
+        return json.loads(line)
+
+    def request(self, command, timeout=None, **args):
+        self.sock.settimeout(timeout or self.timeout)
+        self.send(command, **args)
+        return self.receive()
+
+    def events(self):
+        self.sock.settimeout(None)
+        self.send('subscribe')
+        self.receive()
+        while True:
+            yield self.receive()
+
+def request(command, address=None, timeout=None, **args):
+    # One-shot command; raises IpcUnavailable when no proxy is running and
+    # IpcError when one is but no reply came.
+    with IpcClient(address) as client:
+        try:
+            return client.request(command, timeout, **args)
+        except TimeoutError as e:
+            raise IpcError(f"Proxy did not reply to {command} within {timeout or client.timeout:g} s") from e
+        except OSError as e:
+            raise IpcError(f"Proxy connection failed during {command}: {e}") from e
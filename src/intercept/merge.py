@@ -0,0 +1,161 @@
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+from capture_log import decode_line
+from export import iter_json_array
+from identity import question_digest
+from question_bank import TIMESTAMP_FORMAT, parse_timestamp
+from render import write_rendered
+
+MERGE_FORMATS = ('.json', '.jsonl', '.ksq')
+# A .ksq corpus keeps every distinct string in memory while it is written
+# (and read), which no memory limit bounds, so merges don't write one.
+UNBOUNDED_FORMATS = ('.ksq',)
+MEMORY_LIMIT = 256 * 2 ** 20
+BANK_BATCH = 1000
+
+SCHEMA = """
+CREATE TABLE merged (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL,
+    first_seen TEXT,
+    last_seen TEXT
+);
+"""
+
+UPSERT = """
+INSERT INTO merged (key, data, first_seen, last_seen) VALUES (?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    first_seen = coalesce(min(first_seen, excluded.first_seen), first_seen, excluded.first_seen),
+    last_seen = coalesce(max(last_seen, excluded.last_seen), last_seen, excluded.last_seen)
+"""
+
+def expand_paths(paths):
+    # Directories stand for the exports directly inside them, oldest name first.
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(MERGE_FORMATS):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+def read_export(file, path):
+    if path.endswith('.jsonl'):
+        for line in file:
+            record = decode_line(line)
+            if record is not None:
+                yield record
+    elif path.endswith('.ksq'):
+        from corpus import read_corpus
+        yield from read_corpus(path)
+    else:
+        yield from iter_json_array(file)
+
+class MergeProgress:
+    def __init__(self, paths):
+        self.total_bytes = sum(os.path.getsize(path) for path in paths)
+        self.done_bytes = 0
+        self.read = 0
+        self.unique = 0
+
+class Merger:
+    # Deduplicates any number of exports through an on-disk index, so memory
+    # stays near `memory_limit` however large the inputs are: half of it goes
+    # to the SQLite page cache, the rest mostly to the batch of pending rows,
+    # whose Python objects take a few times the size of their JSON.
+    def __init__(self, directory, memory_limit=MEMORY_LIMIT):
+        self.path = os.path.join(directory, 'merge.db')
+        self.memory_limit = memory_limit
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute('PRAGMA journal_mode=OFF')
+        self.connection.execute('PRAGMA synchronous=OFF')
+        self.connection.execute(f'PRAGMA cache_size=-{max(memory_limit // 2 // 1024, 1024)}')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, paths, progress=None):
+        state = MergeProgress(paths)
+        batch = []
+        batch_bytes = 0
+        batch_limit = self.memory_limit // 32
+
+        def flush():
+            nonlocal batch_bytes
+            with self.connection:
+                self.connection.executemany(UPSERT, batch)
+            batch.clear()
+            batch_bytes = 0
+            state.unique = self.connection.execute('SELECT max(id) FROM merged').fetchone()[0] or 0
+
+        for path in paths:
+            size = os.path.getsize(path)
+            with open(path, 'rb') as file:
+                for question in read_export(file, path):
+                    seen = parse_timestamp(question.get('timestamp'))
+                    data = json.dumps(question, ensure_ascii=False)
+                    batch.append((question_digest(question), data, seen, seen))
+                    batch_bytes += len(data)
+                    state.read += 1
+                    if batch_bytes >= batch_limit:
+                        flush()
+                        if progress is not None:
+                            progress(state, state.done_bytes + min(file.tell(), size))
+            if batch:
+                flush()
+            state.done_bytes += size
+            if progress is not None:
+                progress(state, state.done_bytes)
+        return state
+
+    def questions(self, keep='earliest'):
+        # Questions in order of first appearance, stamped with the earliest or
+        # latest time any of the inputs saw them.
+        column = 'first_seen' if keep == 'earliest' else 'last_seen'
+        for data, seen in self.connection.execute(f'SELECT data, {column} FROM merged ORDER BY id'):
+            question = json.loads(data)
+            if seen is not None:
+                question['timestamp'] = datetime.fromisoformat(seen).strftime(TIMESTAMP_FORMAT)
+            yield question
+
+def banked(questions, question_bank):
+    # Passes the questions through, adding them to the question bank (and so
+    # its search index) a transaction per batch.
+    batch = []
+    for question in questions:
+        batch.append(question)
+        yield question
+        if len(batch) >= BANK_BATCH:
+            question_bank.add(batch)
+            batch = []
+    question_bank.add(batch)
+
+def merge_exports(paths, destination, keep='earliest', memory_limit=MEMORY_LIMIT, progress=None,
+                  question_bank=None):
+    # Writes the deduplicated union of the exports to destination, in the
+    # format given by its extension, and adds it to question_bank if one is
+    # given. The index is kept next to the destination, since it can be as
+    # large as the result. Returns the (questions read, unique questions)
+    # counts.
+    if destination.endswith(UNBOUNDED_FORMATS):
+        raise ValueError(f"merge can't write {destination}: a .ksq corpus isn't bounded by the memory limit, "
+                         f"merge to .json and convert that")
+    paths = list(expand_paths(paths))
+    directory = os.path.dirname(os.path.abspath(destination))
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='.merge-', dir=directory) as work_directory:
+        merger = Merger(work_directory, memory_limit)
+        try:
+            state = merger.add(paths, progress)
+            questions = merger.questions(keep)
+            if question_bank is not None:
+                questions = banked(questions, question_bank)
+            write_rendered(destination, questions)
+        finally:
+            merger.close()
+    return state.read, state.unique
@@ -0,0 +1,192 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from 50 µs to 10 s; a capture stage lands in the
+# millisecond range.
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def exposition(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation, which is as
+        # precise as a bucketed histogram gets.
+        with self.lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets, counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def exposition(self, name, labels):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.count
+            value_sum = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {total}')
+        lines.append(f'{name}_sum{{{labels}}} {value_sum}')
+        lines.append(f'{name}_count{{{labels}}} {total}')
+        return lines
+
+class StageTimer:
+    # One latency histogram per named stage of the capture path.
+    def __init__(self, name, help, stages):
+        self.name = name
+        self.help = help
+        self.stages = {stage: Histogram() for stage in stages}
+
+    @contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage].observe(time.perf_counter() - started)
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for stage, histogram in self.stages.items():
+            lines.extend(histogram.exposition(self.name, f'stage="{stage}"'))
+        return lines
+
+    def summary(self):
+        parts = []
+        for stage, histogram in self.stages.items():
+            if histogram.count:
+                p50 = histogram.quantile(0.5) * 1000
+                p99 = histogram.quantile(0.99) * 1000
+                parts.append(f"{stage} p50<={p50:g}ms p99<={p99:g}ms")
+        return ', '.join(parts)
+
+def exposition(*metrics):
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.exposition())
+    return '\n'.join(lines) + '\n'
+
+class MetricsServer:
+    # Serves `render()` as a Prometheus text endpoint on 127.0.0.1.
+    def __init__(self, render, port):
+        self.render = render
+        self.port = port
+        self.server = None
+
+    def start(self):
+        render = self.render
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='metrics-server', daemon=True).start()
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+class Profiler:
+    # Opt-in deep dive: cProfile around the calls made through `call` and
+    # tracemalloc for the whole process, written out by `dump`.
+    def __init__(self):
+        self.profile = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.profile is not None
+
+    def enable(self):
+        import cProfile
+        import tracemalloc
+
+        with self.lock:
+            if self.profile is None:
+                self.profile = cProfile.Profile()
+                tracemalloc.start()
+
+    def disable(self):
+        import tracemalloc
+
+        with self.lock:
+            self.profile = None
+            tracemalloc.stop()
+
+    def call(self, function, *args):
+        with self.lock:
+            if self.profile is None:
+                return function(*args)
+            return self.profile.runcall(function, *args)
+
+    def dump(self, directory):
+        # Writes <timestamp>.prof (for pstats/snakeviz) and <timestamp>.tracemalloc
+        # (a tracemalloc.Snapshot) and returns their paths.
+        import tracemalloc
+
+        with self.lock:
+            if self.profile is None:
+                return []
+            os.makedirs(directory, exist_ok=True)
+            base = os.path.join(directory, time.strftime("%d-%m-%Y_%H-%M-%S"))
+            self.profile.dump_stats(f"{base}.prof")
+            tracemalloc.take_snapshot().dump(f"{base}.tracemalloc")
+            return [f"{base}.prof", f"{base}.tracemalloc"]
@@ -0,0 +1,142 @@
+import functools
+import fastjson
+
+# Validated form of the questions the exam page embeds in <questions>. The
+# page gives types as numbers plus a {"QUESTION_TYPE_SINGLE": 1, ...} table;
+# decoding maps them to names, stamps the capture time and rejects records
+# the exporters couldn't render.
+
+TYPE_PREFIX = 'QUESTION_TYPE_'
+MATCHING = 'MATCHING'
+QUESTION_FIELDS = ('id', 'text', 'type', 'images', 'answers', 'answers_draggable')
+ANSWER_FIELDS = ('uid', 'answer', 'images')
+
+class InvalidQuestion(ValueError):
+    pass
+
+@functools.lru_cache(maxsize=16)
+def type_table(question_types):
+    # {type number: type name} for the raw question-types attribute. Every page
+    # of a test carries the same table, so it is parsed once.
+    names = fastjson.loads(question_types)
+    if not isinstance(names, dict):
+        raise InvalidQuestion("question types is not an object")
+    table = {}
+    for name, number in names.items():
+        if not isinstance(number, (int, str)):
+            raise InvalidQuestion(f"question type {name!r} has number {number!r}")
+        table[number] = name[len(TYPE_PREFIX):] if name.startswith(TYPE_PREFIX) else name
+    return table
+
+QUESTION_KEYS = frozenset(QUESTION_FIELDS + ('timestamp',))
+ANSWER_KEYS = frozenset(ANSWER_FIELDS)
+
+def check_images(images):
+    if images is None:
+        return []
+    if type(images) is not list:
+        raise InvalidQuestion("images is not a list of file names")
+    for image in images:
+        if type(image) is not str:
+            raise InvalidQuestion("images is not a list of file names")
+    return images
+
+class Answer:
+    __slots__ = ANSWER_FIELDS + ('extra',)
+
+    def __init__(self, uid, answer, images, extra=None):
+        self.uid = uid
+        self.answer = answer
+        self.images = images
+        self.extra = extra
+
+    @classmethod
+    def decode(cls, raw):
+        if type(raw) is not dict:
+            raise InvalidQuestion("answer is not an object")
+        answer = raw.get('answer')
+        if type(answer) is not str:
+            raise InvalidQuestion("answer has no text")
+        extra = None
+        if raw.keys() - ANSWER_KEYS:
+            extra = {key: value for key, value in raw.items() if key not in ANSWER_KEYS}
+        return cls(raw.get('uid'), answer, check_images(raw.get('images')), extra)
+
+    def as_dict(self):
+        record = {'uid': self.uid, 'answer': self.answer, 'images': self.images}
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+class Question:
+    __slots__ = QUESTION_FIELDS + ('timestamp', 'extra')
+
+    def __init__(self, id, text, type, images, answers, answers_draggable=None, timestamp=None, extra=None):
+        self.id = id
+        self.text = text
+        self.type = type
+        self.images = images
+        self.answers = answers
+        self.answers_draggable = answers_draggable
+        self.timestamp = timestamp
+        self.extra = extra
+
+    @classmethod
+    def decode(cls, raw, types, timestamp):
+        # Raises InvalidQuestion with the reason when the record doesn't fit.
+        if type(raw) is not dict:
+            raise InvalidQuestion("question is not an object")
+        text = raw.get('text')
+        if type(text) is not str:
+            raise InvalidQuestion("question has no text")
+        # Only numbers and names can be looked up, a list or object is just as unknown.
+        raw_type = raw.get('type')
+        question_type = types.get(raw_type) if isinstance(raw_type, (int, str)) else None
+        if question_type is None:
+            raise InvalidQuestion(f"unknown question type {raw.get('type')!r}")
+
+        answers = raw.get('answers')
+        if type(answers) is not list:
+            raise InvalidQuestion("answers is not a list")
+        answers = [Answer.decode(answer) for answer in answers]
+        answers_draggable = raw.get('answers_draggable')
+        if answers_draggable is not None or question_type == MATCHING:
+            if type(answers_draggable) is not list:
+                raise InvalidQuestion("MATCHING question without answers_draggable")
+            answers_draggable = [Answer.decode(answer) for answer in answers_draggable]
+
+        extra = None
+        if raw.keys() - QUESTION_KEYS:
+            extra = {key: value for key, value in raw.items() if key not in QUESTION_KEYS}
+        return cls(raw.get('id'), text, question_type, check_images(raw.get('images')), answers,
+                   answers_draggable, timestamp, extra)
+
+    def as_dict(self):
+        # The record stored in the capture log and exported as JSON.
+        record = {}
+        if self.id is not None:
+            record['id'] = self.id
+        record['text'] = self.text
+        record['type'] = self.type
+        record['images'] = self.images
+        record['answers'] = [answer.as_dict() for answer in self.answers]
+        if self.answers_draggable is not None:
+            record['answers_draggable'] = [answer.as_dict() for answer in self.answers_draggable]
+        if self.extra:
+            record.update(self.extra)
+        if self.timestamp is not None:
+            record['timestamp'] = self.timestamp
+        return record
+
+def decode_questions(raw_questions, types, timestamp):
+    # Returns (questions, rejected), rejected being (raw record, reason) pairs.
+    questions = []
+    rejected = []
+    if not isinstance(raw_questions, list):
+        return questions, [(raw_questions, "questions is not a list")]
+    for raw in raw_questions:
+        try:
+            questions.append(Question.decode(raw, types, timestamp))
+        except InvalidQuestion as e:
+            rejected.append((raw, str(e)))
+    return questions, rejected
@@ -0,0 +1,86 @@
+import threading
+
+LISTEN_PORT = 44700
+
+class Lifecycle:
+    def __init__(self, proxy):
+        self.proxy = proxy
+
+    def running(self):
+        self.proxy.started.set()
+
+class EmbeddedProxy:
+    # Runs mitmproxy's DumpMaster with the intercept addon on a thread of this
+    # process, instead of a separate mitmdump.
+    def __init__(self, port=LISTEN_PORT, quiet=False, **options):
+        self.port = port
+        self.quiet = quiet
+        self.options = options
+        self.thread = None
+        self.loop = None
+        self.master = None
+        self.error = None
+        self.started = threading.Event()
+
+    def start(self, timeout=10):
+        if self.is_running():
+            return
+        self.error = None
+        self.started.clear()
+        self.thread = threading.Thread(target=self.run, name='embedded-proxy', daemon=True)
+        self.thread.start()
+
+        self.started.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        if not self.started.is_set():
+            raise TimeoutError(f"Proxy did not start within {timeout} seconds")
+
+    def run(self):
+        import asyncio
+
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            self.error = e
+        finally:
+            self.started.set()
+
+    async def serve(self):
+        import asyncio
+        from mitmproxy import options
+        from mitmproxy.tools.dump import DumpMaster
+        import intercept
+
+        self.loop = asyncio.get_running_loop()
+        opts = options.Options(listen_port=self.port)
+        self.master = DumpMaster(opts, with_termlog=not self.quiet, with_dumper=not self.quiet)
+        self.master.addons.add(intercept, Lifecycle(self))
+        if self.options:
+            opts.update(**self.options)
+        try:
+            await self.master.run()
+        finally:
+            self.master = None
+            self.loop = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stop(self, timeout=30):
+        # Shutting the master down runs the addon's done hook, which drains
+        # pending captures before the thread exits.
+        if not self.is_running():
+            return
+        loop, master = self.loop, self.master
+        if loop is not None and master is not None:
+            loop.call_soon_threadsafe(master.shutdown)
+        self.thread.join(timeout)
+
+    def restart(self, timeout=10):
+        self.stop()
+        self.start(timeout)
+
+    def wait(self):
+        while self.is_running():
+            self.thread.join(0.5)
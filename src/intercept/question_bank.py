@@ -0,0 +1,217 @@
+import functools
+import json
+import sqlite3
+from datetime import datetime
+from identity import question_digest
+from search import answers_text, index_text, match_query
+
+BANK_FILE = 'question_bank.db'
+TIMESTAMP_FORMAT = "%d-%m-%Y_%H-%M-%S"
+SCHEMA_VERSION = 2
+RANK_WINDOW = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    type TEXT NOT NULL,
+    text TEXT NOT NULL,
+    data TEXT NOT NULL,
+    first_seen TEXT,
+    last_seen TEXT,
+    seen_count INTEGER NOT NULL DEFAULT 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS questions_key ON questions (key);
+CREATE INDEX IF NOT EXISTS questions_type ON questions (type);
+CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5 (
+    text, answers, content='', tokenize='unicode61 remove_diacritics 0'
+);
+"""
+
+@functools.lru_cache(maxsize=1024)
+def parse_timestamp(timestamp):
+    # Captures are stamped as "%d-%m-%Y_%H-%M-%S", which doesn't sort; store ISO.
+    # Every question of a capture shares its stamp, hence the cache.
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT).isoformat(sep=' ')
+    except (TypeError, ValueError):
+        return None
+
+class QuestionBank:
+    def __init__(self, path=BANK_FILE):
+        self.path = path
+        self.connection = None
+
+    def open(self):
+        if self.connection is None:
+            # The addon writes from its worker thread and closes from the main
+            # one; access is never concurrent.
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.executescript(SCHEMA)
+            self.migrate()
+        return self
+
+    def migrate(self):
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with self.connection:
+            if version < 1:
+                self.rekey()
+            if version < 2:
+                for row_id, data in self.connection.execute('SELECT id, data FROM questions').fetchall():
+                    self.index(row_id, json.loads(data))
+            self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def rekey(self):
+        # Version 0 keyed questions by raw text and answer uids; rekey by content
+        # digest and fold the rows that turn out to be the same question.
+        rows = self.connection.execute(
+            'SELECT id, data, first_seen, last_seen, seen_count FROM questions ORDER BY id').fetchall()
+        kept = {}
+        for row_id, data, first_seen, last_seen, seen_count in rows:
+            key = question_digest(json.loads(data))
+            if key not in kept:
+                kept[key] = [row_id, first_seen, last_seen, seen_count]
+                continue
+            merged = kept[key]
+            merged[1] = min(filter(None, (merged[1], first_seen)), default=None)
+            merged[2] = max(filter(None, (merged[2], last_seen)), default=None)
+            merged[3] += seen_count
+            self.connection.execute('DELETE FROM questions WHERE id = ?', (row_id,))
+        self.connection.execute('UPDATE questions SET key = -id')
+        self.connection.executemany(
+            'UPDATE questions SET key = ?, first_seen = ?, last_seen = ?, seen_count = ? WHERE id = ?',
+            [(key, first_seen, last_seen, seen_count, row_id)
+             for key, (row_id, first_seen, last_seen, seen_count) in kept.items()],
+        )
+
+    def index(self, row_id, question):
+        # The search index is contentless: it holds the tokens, the questions
+        # table holds the text, and both share the row id.
+        self.connection.execute(
+            'INSERT INTO questions_fts (rowid, text, answers) VALUES (?, ?, ?)',
+            (row_id, index_text(question), answers_text(question)),
+        )
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, questions):
+        # Idempotent: a question already in the bank only has its seen range and
+        # counter updated. Returns the number of new questions.
+        self.open()
+        added = 0
+        with self.connection:
+            for question in questions:
+                key = question_digest(question)
+                seen = parse_timestamp(question.get('timestamp'))
+                cursor = self.connection.execute(
+                    'INSERT OR IGNORE INTO questions (key, type, text, data, first_seen, last_seen) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, question.get('type', ''), question['text'],
+                     json.dumps(question, ensure_ascii=False), seen, seen),
+                )
+                if cursor.rowcount:
+                    self.index(cursor.lastrowid, question)
+                    added += 1
+                    continue
+                self.connection.execute(
+                    'UPDATE questions SET seen_count = seen_count + 1, '
+                    'first_seen = coalesce(min(first_seen, ?), first_seen, ?), '
+                    'last_seen = coalesce(max(last_seen, ?), last_seen, ?) '
+                    'WHERE key = ?',
+                    (seen, seen, seen, seen, key),
+                )
+        return added
+
+    def where(self, text=None, question_type=None):
+        clauses = []
+        params = []
+        if text:
+            clauses.append("text LIKE ? ESCAPE '\\'")
+            escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"%{escaped}%")
+        if question_type:
+            clauses.append('type = ?')
+            params.append(question_type)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def count(self, text=None, question_type=None):
+        self.open()
+        where, params = self.where(text, question_type)
+        return self.connection.execute(f'SELECT count(*) FROM questions{where}', params).fetchone()[0]
+
+    def query(self, text=None, question_type=None, limit=None):
+        self.open()
+        where, params = self.where(text, question_type)
+        sql = f'SELECT data FROM questions{where} ORDER BY id'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        for (data,) in self.connection.execute(sql, params):
+            yield json.loads(data)
+
+    def search(self, text, question_type=None, limit=20):
+        # Best matches first: bm25 over the index, a match in the question text
+        # counting for more than one in the answers. Scoring costs microseconds
+        # a match, so a query matching more than RANK_WINDOW questions, like
+        # one made of common words, only has the newest of them ranked; see
+        # search_truncated.
+        self.open()
+        expression = match_query(text)
+        if expression is None:
+            return
+        where, params = self.match_where(expression, question_type)
+        ranked = self.connection.execute(
+            'SELECT rowid FROM (SELECT rowid, bm25(questions_fts, 4.0, 1.0) AS score FROM questions_fts'
+            f'{where} ORDER BY rowid DESC LIMIT ?) ORDER BY score LIMIT ?',
+            [*params, RANK_WINDOW, limit],
+        ).fetchall()
+        placeholders = ', '.join('?' * len(ranked))
+        data = dict(self.connection.execute(
+            f'SELECT id, data FROM questions WHERE id IN ({placeholders})', [row_id for (row_id,) in ranked]))
+        for (row_id,) in ranked:
+            yield json.loads(data[row_id])
+
+    def search_truncated(self, text, question_type=None):
+        # Whether search() left older matches of the query unranked. Counts no
+        # further than one match past the window, without scoring them.
+        self.open()
+        expression = match_query(text)
+        if expression is None:
+            return False
+        where, params = self.match_where(expression, question_type)
+        matches = self.connection.execute(
+            f'SELECT count(*) FROM (SELECT rowid FROM questions_fts{where} LIMIT ?)',
+            [*params, RANK_WINDOW + 1]).fetchone()[0]
+        return matches > RANK_WINDOW
+
+    def match_where(self, expression, question_type=None):
+        where = ' WHERE questions_fts MATCH ?'
+        params = [expression]
+        if question_type:
+            where += ' AND rowid IN (SELECT id FROM questions WHERE type = ?)'
+            params.append(question_type)
+        return where, params
+
+    def items(self, question_type=None):
+        self.open()
+        where, params = self.where(question_type=question_type)
+        for key, data in self.connection.execute(f'SELECT key, data FROM questions{where} ORDER BY id', params):
+            yield key, json.loads(data)
+
+    def types(self):
+        self.open()
+        return self.connection.execute(
+            'SELECT type, count(*) FROM questions GROUP BY type ORDER BY type').fetchall()
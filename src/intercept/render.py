@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+
+QUESTION_IMAGE_BASE_URL = 'https://ks.rsmu.ru/upload/l_btz_filequestion/'
+ANSWER_IMAGE_BASE_URL = 'https://ks.rsmu.ru/upload/l_btz_fileanswer/'
+
+# Renderers are generators that take an iterable of questions and yield text
+# chunks, roughly one per question, so exports never hold the whole output.
+# `image_url` maps a remote image URL to what should be written instead, e.g.
+# a path into the local image archive.
+
+def question_image(image, image_url=None):
+    url = QUESTION_IMAGE_BASE_URL + image
+    return image_url(url) if image_url else url
+
+def answer_line(answer, image_url=None):
+    if image_url is None:
+        image_ids = ', '.join(answer['images']) if answer['images'] else ''
+        return f"{answer['answer']} ({ANSWER_IMAGE_BASE_URL}{image_ids})" if image_ids else answer['answer']
+    images = ', '.join(image_url(ANSWER_IMAGE_BASE_URL + image) for image in answer['images'])
+    return f"{answer['answer']} ({images})" if images else answer['answer']
+
+def question_text_lines(question, image_url=None):
+    question_type = question['type']
+    lines = [f"{question_type} {question['text']}"]
+    for i, image in enumerate(question['images'], start=1):
+        lines.append(f"КАРТИНКА ВОПРОСА {i}: {question_image(image, image_url)}")
+
+    if question_type == 'MATCHING':
+        # Captures are validated, but older logs and imported files may lack
+        # a side; render what there is rather than drop the question.
+        answers = question.get('answers') or ()
+        answers_draggable = question.get('answers_draggable') or ()
+
+        max_answer_length = 0
+        for answer in answers:
+            lines.append(answer_line(answer, image_url))
+            max_answer_length = max(max_answer_length, len(answer['answer']))
+        separator = len(lines)
+        lines.append('')
+        for answer in answers_draggable:
+            lines.append(answer_line(answer, image_url))
+            max_answer_length = max(max_answer_length, len(answer['answer']))
+        lines[separator] = '-' * max_answer_length
+    else:
+        lines.extend(answer_line(answer, image_url) for answer in question['answers'])
+
+    lines.append('')
+    return lines
+
+def render_text(questions, image_url=None):
+    first = True
+    for question in questions:
+        block = '\n'.join(question_text_lines(question, image_url))
+        yield block if first else '\n' + block
+        first = False
+
+def render_json(questions, image_url=None):
+    # Same layout as json.dump(questions, indent=4), one question at a time.
+    empty = True
+    for question in questions:
+        item = json.dumps(question, ensure_ascii=False, indent=4).replace('\n', '\n    ')
+        yield ('[\n    ' if empty else ',\n    ') + item
+        empty = False
+    yield '[]' if empty else '\n]'
+
+def render_markdown(questions, image_url=None):
+    for number, question in enumerate(questions, start=1):
+        lines = [f"### {number}. {question['type']}", '', question['text'], '']
+        for i, image in enumerate(question['images'], start=1):
+            lines.append(f"![Картинка вопроса {i}]({question_image(image, image_url)})")
+        if question['images']:
+            lines.append('')
+        lines.extend(f"- {answer_line(answer, image_url)}" for answer in question.get('answers', ()))
+        if question.get('answers_draggable'):
+            lines.append('')
+            lines.extend(f"- {answer_line(answer, image_url)}" for answer in question['answers_draggable'])
+        lines.extend(['', ''])
+        yield '\n'.join(lines)
+
+CSV_FIELDS = ['type', 'text', 'images', 'answers', 'answers_draggable', 'timestamp']
+
+def render_csv(questions, image_url=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(CSV_FIELDS)
+    yield flush()
+    for question in questions:
+        writer.writerow([
+            question['type'],
+            question['text'],
+            ' '.join(question_image(image, image_url) for image in question['images']),
+            '\n'.join(answer_line(answer, image_url) for answer in question.get('answers', ())),
+            '\n'.join(answer_line(answer, image_url) for answer in question.get('answers_draggable', ())),
+            question.get('timestamp', ''),
+        ])
+        yield flush()
+
+RENDERERS = {
+    'txt': render_text,
+    'json': render_json,
+    'md': render_markdown,
+    'csv': render_csv,
+}
+
+# Formats that store the records themselves rather than rendering them.
+EXPORT_FORMATS = list(RENDERERS) + ['ksq']
+DEFAULT_FORMATS = ('txt', 'json')
+
+def write_rendered(path, questions, output_format=None, image_url=None):
+    output_format = output_format or str(path).rsplit('.', 1)[-1]
+    if output_format == 'ksq':
+        from corpus import write_corpus
+        write_corpus(path, questions)
+        return
+    renderer = RENDERERS[output_format]
+    newline = '' if output_format == 'csv' else None
+    with open(path, 'w', encoding='utf-8-sig', newline=newline) as file:
+        file.writelines(renderer(questions, image_url))
+
+def render_questions_to_text(questions):
+    return ''.join(render_text(questions))
@@ -0,0 +1,47 @@
+import re
+
+QUESTIONS_ROUTE = 'questions'
+IMAGES_ROUTE = 'images'
+DEFAULT_CAPTURE_ROUTES = ('ks2.rsmu.ru/tests2/questions',)
+DEFAULT_IMAGE_ROUTES = ('ks.rsmu.ru/upload/l_btz_filequestion/*', 'ks.rsmu.ru/upload/l_btz_fileanswer/*')
+# Hosts that have to stay intercepted for the proxy itself to be usable:
+# mitm.it serves the CA certificate.
+SERVICE_HOSTS = ('mitm.it',)
+
+class RouteTable:
+    # Routes are "host/path" for an exact path or "host/prefix*" for a prefix.
+    # Lookups of other hosts cost a single dict miss.
+    def __init__(self):
+        self.exact = {}
+        self.prefixes = {}
+
+    def add(self, route, name):
+        host, _, path = route.partition('/')
+        host = host.lower()
+        path = '/' + path
+        if path.endswith('*'):
+            self.prefixes.setdefault(host, []).append((path[:-1], name))
+        else:
+            self.exact.setdefault(host, {})[path] = name
+        self.exact.setdefault(host, {})
+        return self
+
+    def match(self, host, path):
+        paths = self.exact.get(host)
+        if paths is None:
+            return None
+        name = paths.get(path)
+        if name is not None:
+            return name
+        for prefix, name in self.prefixes.get(host, ()):
+            if path.startswith(prefix):
+                return name
+        return None
+
+    def hosts(self):
+        return sorted(self.exact)
+
+def host_patterns(hosts):
+    # Depending on its version mitmproxy matches allow_hosts against the bare
+    # host or against "host:port".
+    return [f"^{re.escape(host)}(:\\d+)?$" for host in hosts]
@@ -0,0 +1,59 @@
+import functools
+import re
+from identity import canonical_text
+
+# Tokens for the question bank's full-text index. Text is indexed in its
+# canonical form (no markup, casefolded, "ё" as "е") with Russian words cut
+# down to a crude stem, and queries are stemmed the same way, so "инфекции"
+# finds "инфекция". This is suffix stripping, not a morphological analyser,
+# but it needs nothing beyond SQLite.
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+MIN_STEM = 3
+# Inflectional endings of Russian nouns, adjectives, participles and verbs.
+RUSSIAN_ENDINGS = frozenset({
+    'иями', 'ями', 'ами', 'иях', 'ях', 'ах', 'ией', 'ей', 'ой', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее',
+    'ые', 'ие', 'ых', 'их', 'ым', 'им', 'ому', 'ему', 'ого', 'его', 'ую', 'юю', 'ою', 'ею', 'ом', 'ем',
+    'ам', 'ям', 'ия', 'ию', 'ии', 'ов', 'ев', 'ться', 'тся', 'ть', 'ет', 'ют', 'ут', 'ит', 'ат', 'ят',
+    'ешь', 'ишь', 'ете', 'ите', 'ал', 'ала', 'ало', 'али', 'ил', 'ила', 'ило', 'или',
+    'ость', 'ости', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+})
+ENDING_LENGTHS = sorted({len(ending) for ending in RUSSIAN_ENDINGS}, reverse=True)
+
+@functools.lru_cache(maxsize=65536)
+def stem(word):
+    # Strips the longest ending that leaves at least MIN_STEM letters. The
+    # vocabulary of the bank is small, so most words come from the cache.
+    if not CYRILLIC_RE.search(word):
+        return word
+    for length in ENDING_LENGTHS:
+        if len(word) - length >= MIN_STEM and word[-length:] in RUSSIAN_ENDINGS:
+            return word[:-length]
+    return word
+
+def stemmed(text):
+    return ' '.join(map(stem, WORD_RE.findall(canonical_text(text))))
+
+def index_text(question):
+    return stemmed(question.get('text'))
+
+def answers_text(question):
+    # Answers and, for MATCHING questions, the items they are matched to.
+    answers = [*(question.get('answers') or ()), *(question.get('answers_draggable') or ())]
+    return stemmed(' '.join(str(answer.get('answer') or '') for answer in answers))
+
+def match_query(query):
+    # An FTS5 MATCH expression requiring every word of the query, or None
+    # when it has no words. The last word also matches as a prefix unless the
+    # query ends with a space, so results follow the user's typing; a prefix
+    # of a stem is a prefix of the word as typed. Quoting
+    # keeps FTS5 operators in the query from being interpreted.
+    words = WORD_RE.findall(canonical_text(query))
+    if not words:
+        return None
+    terms = [f'"{stem(word)}"' for word in words]
+    if not query[-1].isspace():
+        prefix = f'"{words[-1]}"*'
+        terms[-1] = prefix if stem(words[-1]) == words[-1] else f'({terms[-1]} OR {prefix})'
+    return ' AND '.join(terms)
@@ -0,0 +1,184 @@
+import collections
+import hashlib
+import os
+import re
+import threading
+from capture_log import CAPTURE_FILE, CaptureLog, segment_paths
+
+# Captures are partitioned by session, so that browser profiles or users
+# sharing one proxy each get their own capture log, save and stats. The
+# default session keeps the original paths; the others live in
+# sessions/<name>/ and are saved to output/<name>/. The question bank stays
+# shared.
+
+DEFAULT_SESSION = 'default'
+SESSIONS_DIR = 'sessions'
+SESSION_MODES = ('none', 'client', 'cookie', 'header')
+SESSION_COOKIE = 'PHPSESSID'
+SESSION_HEADER = 'X-Intercept-Session'
+SESSION_STATS = ('captures', 'questions', 'new_questions', 'duplicates')
+# Capture logs kept open at once; the least recently used beyond that are
+# closed and reopened by their next capture.
+MAX_OPEN_LOGS = 64
+UNSAFE_RE = re.compile(r'[^\w.-]+')
+
+def safe_name(value):
+    return UNSAFE_RE.sub('_', value).strip('._')[:64] or DEFAULT_SESSION
+
+def session_name(flow, mode, key=''):
+    # key names the cookie or header, the usual one when empty.
+    if mode == 'client':
+        return safe_name(f"client-{flow.client_conn.peername[0]}")
+    if mode == 'cookie':
+        value = flow.request.cookies.get(key or SESSION_COOKIE)
+        if value:
+            # A session cookie is a credential, only a digest of it goes to disk.
+            return 'cookie-' + hashlib.blake2b(value.encode('utf-8'), digest_size=6).hexdigest()
+    elif mode == 'header':
+        value = flow.request.headers.get(key or SESSION_HEADER)
+        if value:
+            return safe_name(value)
+    return DEFAULT_SESSION
+
+def session_directory(directory, name):
+    return directory if name == DEFAULT_SESSION else os.path.join(directory, SESSIONS_DIR, name)
+
+def output_directory(output_dir, name):
+    return output_dir if name == DEFAULT_SESSION else os.path.join(output_dir, name)
+
+def session_names(directory):
+    # The default session and every session with a capture log, or segments
+    # of one, on disk.
+    names = [DEFAULT_SESSION]
+    root = os.path.join(directory, SESSIONS_DIR)
+    if os.path.isdir(root):
+        names.extend(sorted(name for name in os.listdir(root) if any(
+            map(os.path.exists, segment_paths(os.path.join(root, name, CAPTURE_FILE))))))
+    return names
+
+class Session:
+    def __init__(self, name, directory, segment_bytes=0, segment_seconds=0):
+        self.name = name
+        self.directory = session_directory(directory, name)
+        self.capture_log = CaptureLog(os.path.join(self.directory, CAPTURE_FILE),
+                                      segment_bytes=segment_bytes, segment_seconds=segment_seconds)
+        # Held while the capture log is written to or sealed for a save, so a
+        # save never races a capture being appended. Every session has its own.
+        self.lock = threading.Lock()
+        # Held for a whole save, so two saves don't both take the same segments.
+        self.save_lock = threading.Lock()
+        self.stats = dict.fromkeys(SESSION_STATS, 0)
+
+    def append(self, records):
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self.capture_log.append(records)
+
+    def count(self, questions, added):
+        self.stats['captures'] += 1
+        self.stats['questions'] += questions
+        self.stats['new_questions'] += added
+        self.stats['duplicates'] += questions - added
+
+    def close(self):
+        with self.lock:
+            self.capture_log.close()
+
+class SessionTable:
+    def __init__(self, directory='.', max_open=MAX_OPEN_LOGS, segment_bytes=0, segment_seconds=0):
+        self.directory = directory
+        self.max_open = max_open
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        # Every session seen since start stays for its stats, a few hundred
+        # bytes each; only idle logs are closed.
+        self.sessions = {}
+        self.open_logs = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, name=DEFAULT_SESSION):
+        name = safe_name(name)
+        with self.lock:
+            session = self.sessions.get(name)
+            if session is None:
+                session = self.sessions[name] = Session(name, self.directory, self.segment_bytes,
+                                                        self.segment_seconds)
+            return session
+
+    def set_rotation(self, segment_bytes, segment_seconds):
+        with self.lock:
+            self.segment_bytes = segment_bytes
+            self.segment_seconds = segment_seconds
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            with session.lock:
+                session.capture_log.segment_bytes = segment_bytes
+                session.capture_log.segment_seconds = segment_seconds
+
+    def all(self, name=None):
+        # The named session, or every session seen since start or on disk.
+        if name is not None:
+            return [self.get(name)]
+        with self.lock:
+            seen = list(self.sessions)
+        return [self.get(each) for each in dict.fromkeys(session_names(self.directory) + seen)]
+
+    def append(self, name, records):
+        session = self.get(name)
+        session.append(records)
+        with self.lock:
+            self.open_logs[session.name] = session
+            self.open_logs.move_to_end(session.name)
+            idle = []
+            while len(self.open_logs) > self.max_open:
+                idle.append(self.open_logs.popitem(last=False)[1])
+        for other in idle:
+            other.close()
+        return session
+
+    def sync(self):
+        for session in self.all():
+            with session.lock:
+                session.capture_log.sync()
+
+    def stats(self):
+        with self.lock:
+            return {name: dict(session.stats) for name, session in self.sessions.items()}
+
+    def reset(self, directory):
+        # Closes every log and starts over in another directory.
+        self.close()
+        with self.lock:
+            self.directory = directory
+            self.sessions = {}
+
+    def close(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.open_logs.clear()
+        for session in sessions:
+            session.close()
+
+def save_sessions(table, formats, output_dir, image_store=None, name=None, memory_limit=None):
+    # Saves every session, or the named one, to its own output folder and
+    # returns the written paths.
+    from export import SAVE_MEMORY_LIMIT, save_captures
+
+    paths = []
+    for session in table.all(name):
+        output = output_directory(output_dir, session.name)
+        with session.save_lock:
+            with session.lock:
+                # Only sealing the active file into a segment holds up captures,
+                # they go on into a new one while the segments are saved. Closing
+                # also lets Windows delete the log.
+                segments = session.capture_log.seal()
+                if segments is None:
+                    # Windows didn't let the active file be renamed, it's saved
+                    # as it is.
+                    paths.extend(save_captures(formats, session.capture_log.path, output, image_store,
+                                               memory_limit or SAVE_MEMORY_LIMIT))
+                    continue
+            paths.extend(save_captures(formats, session.capture_log.path, output, image_store,
+                                       memory_limit or SAVE_MEMORY_LIMIT, segments))
+    return paths
@@ -0,0 +1,80 @@
+import asyncio
+import queue
+import threading
+import traceback
+
+STOP = object()
+
+class CaptureWorker:
+    # Runs `handler(*job)` for every submitted job on one background thread.
+    # A single consumer keeps captures persisted in the order they arrived; the
+    # bounded queue pushes back on the proxy when processing falls behind.
+    def __init__(self, handler, maxsize=64, name='capture-worker'):
+        self.handler = handler
+        self.jobs = queue.Queue(maxsize)
+        self.name = name
+        self.thread = None
+        self.lock = threading.Lock()
+        self.closed = False
+        # Made for the running event loop, a restarted proxy brings a new one.
+        self.submit_lock = None
+        self.submit_loop = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None and not self.closed:
+                self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is STOP:
+                    return
+                self.handler(*job)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self.jobs.task_done()
+
+    def submit(self, *job):
+        if self.closed:
+            raise RuntimeError("worker is closed")
+        self.start()
+        self.jobs.put(job)
+
+    async def submit_async(self, *job):
+        if self.closed:
+            raise RuntimeError("worker is closed")
+        self.start()
+        loop = asyncio.get_running_loop()
+        if self.submit_loop is not loop:
+            self.submit_lock, self.submit_loop = asyncio.Lock(), loop
+        # Flows waiting for room get it first come, first served, and new ones
+        # queue up behind them: the lock hands over in FIFO order.
+        async with self.submit_lock:
+            try:
+                self.jobs.put_nowait(job)
+            except queue.Full:
+                # Only flows being captured wait for room, the event loop keeps
+                # serving everything else.
+                await loop.run_in_executor(None, self.jobs.put, job)
+
+    def join(self):
+        if self.thread is not None:
+            self.jobs.join()
+
+    def close(self):
+        # Drains every queued job. The worker can be started again afterwards,
+        # which is what a proxy restart does.
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        if self.thread is not None:
+            self.jobs.put(STOP)
+            self.thread.join()
+        with self.lock:
+            self.thread = None
+            self.closed = False